@@ -0,0 +1,78 @@
+# -*- coding: utf-8 -*-
+
+# Copyright (c) 2016 NASK. All rights reserved.
+
+"""
+Benchmark of :meth:`n6sdk.data_spec.fields.DateTimeField.clean_result_value`
+-- for the ``time``, ``modified``, ``until`` and ``expires`` fields of
+:class:`n6sdk.data_spec.DataSpec`, comparing the current implementation
+of :func:`n6sdk.datetime_helpers.datetime_utc_normalize` with the
+former one (based on a float timestamp round-trip).
+
+Usage:
+
+    python benchmarks/bench_datetime_field.py [<number of repetitions>]
+
+(n6sdk needs to be importable, e.g., installed in the active environment.)
+"""
+
+import contextlib
+import datetime
+import sys
+import timeit
+
+import n6sdk.data_spec.fields
+import n6sdk.datetime_helpers
+from n6sdk.data_spec import DataSpec
+from n6sdk.datetime_helpers import (
+    FixedOffsetTimezone,
+    datetime_to_utc_timestamp,
+)
+
+
+FIELD_NAMES = ('time', 'modified', 'until', 'expires')
+
+VALUES = [
+    ('naive datetime',
+     datetime.datetime(2016, 3, 15, 10, 11, 12, 123456)),
+    ('TZ-aware datetime',
+     datetime.datetime(2016, 3, 15, 12, 11, 12, 123456,
+                       tzinfo=FixedOffsetTimezone(120))),
+    ('ISO string',
+     '2016-03-15T10:11:12Z'),
+]
+
+
+def legacy_datetime_utc_normalize(dt):
+    return datetime.datetime.utcfromtimestamp(datetime_to_utc_timestamp(dt))
+
+
+def bench(number):
+    data_spec = DataSpec()
+    for field_name in FIELD_NAMES:
+        clean_result_value = getattr(data_spec, field_name).clean_result_value
+        for label, value in VALUES:
+            timer = timeit.Timer(lambda: clean_result_value(value))
+            current = min(timer.repeat(3, number))
+            with _legacy_datetime_utc_normalize_used():
+                legacy = min(timer.repeat(3, number))
+            print ('{:9} {:18} legacy: {:.3f}s  current: {:.3f}s  ({:.1f}x)'
+                   .format(field_name, label, legacy, current,
+                           legacy / current))
+
+
+@contextlib.contextmanager
+def _legacy_datetime_utc_normalize_used():
+    modules = [n6sdk.data_spec.fields, n6sdk.datetime_helpers]
+    original = [module.datetime_utc_normalize for module in modules]
+    for module in modules:
+        module.datetime_utc_normalize = legacy_datetime_utc_normalize
+    try:
+        yield
+    finally:
+        for module, func in zip(modules, original):
+            module.datetime_utc_normalize = func
+
+
+if __name__ == '__main__':
+    bench(int(sys.argv[1]) if len(sys.argv) > 1 else 100000)
@@ -2,7 +2,16 @@
 
 # Copyright (c) 2013-2014 NASK. All rights reserved.
 
+import bisect
 import socket
+import struct
+
+import ipaddr
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
 
 
 def ip_network_as_tuple(ip_network_str):
@@ -35,5 +44,510 @@ def ip_str_to_int(ip_str):
     """
     >>> ip_str_to_int('10.20.30.41')
     169090601
+    >>> ip_str_to_int(u'10.20.30.41')
+    169090601
+    >>> ip_str_to_int('10.20.7721')   # (a legacy `inet_aton()` form)
+    169090601
+    """
+    try:
+        # fast path (for the decimal dotted-quad notation)
+        return ip_strict_str_to_int(ip_str)
+    except ValueError:
+        return int(socket.inet_aton(ip_str).encode('hex'), 16)
+
+
+# (maps octet strings to their int values -- no leading zeros etc.)
+_DECIMAL_OCTET_STR_TO_INT = {str(i): i for i in xrange(256)}
+
+
+def ip_strict_str_to_int(
+        ip_str,
+        # [the following constant is placed here as a pseudo-argument
+        # just for efficiency (local variable lookups are faster than
+        # dict-based global/builtin lookups)]
+        _octet_str_to_int=_DECIMAL_OCTET_STR_TO_INT):
+    """
+    Validate an IPv4 address in decimal dotted-quad notation and
+    convert it to an int -- in one pass (without any regular expression
+    matching).
+
+    Args:
+        `ip_str`:
+            The address as a :class:`str` or :class:`unicode` string.
+
+    Returns:
+        The address as an :class:`int` number.
+
+    Raises:
+        :exc:`~exceptions.ValueError` if `ip_str` is not a valid IPv4
+        address in decimal dotted-quad notation (the same as required
+        by :data:`n6sdk.regexes.IPv4_STRICT_DECIMAL_REGEX`).
+
+    >>> ip_strict_str_to_int('10.20.30.41')
+    169090601
+    >>> ip_strict_str_to_int(u'255.255.255.255')
+    4294967295
+    >>> ip_strict_str_to_int('0.0.0.0')
+    0
+    >>> ip_strict_str_to_int('10.20.7721')   # doctest: +IGNORE_EXCEPTION_DETAIL
+    Traceback (most recent call last):
+      ...
+    ValueError: ...
+    >>> ip_strict_str_to_int('10.20.30.041') # doctest: +IGNORE_EXCEPTION_DETAIL
+    Traceback (most recent call last):
+      ...
+    ValueError: ...
+    >>> ip_strict_str_to_int('10.20.30.256') # doctest: +IGNORE_EXCEPTION_DETAIL
+    Traceback (most recent call last):
+      ...
+    ValueError: ...
+    >>> ip_strict_str_to_int('10.20.30.4 ')  # doctest: +IGNORE_EXCEPTION_DETAIL
+    Traceback (most recent call last):
+      ...
+    ValueError: ...
+    """
+    try:
+        octet_1, octet_2, octet_3, octet_4 = ip_str.split('.')
+        return ((_octet_str_to_int[octet_1] << 24) |
+                (_octet_str_to_int[octet_2] << 16) |
+                (_octet_str_to_int[octet_3] << 8) |
+                _octet_str_to_int[octet_4])
+    except (ValueError, KeyError, AttributeError):
+        raise ValueError('{!r} is not a valid IPv4 address in decimal '
+                         'dotted-quad notation'.format(ip_str))
+
+
+#
+# batch versions of the above functions
+#
+# (if NumPy is available, `numpy.uint32` arrays are returned, otherwise
+# lists of ints are returned -- so the results can always be indexed,
+# iterated over and compared in the same way)
+
+def ip_networks_as_tuples(ip_network_strs):
+    """
+    The batch version of :func:`ip_network_as_tuple`.
+
+    >>> ip_networks_as_tuples(['10.20.30.40/24', '1.2.3.4/32'])
+    [('10.20.30.40', 24), ('1.2.3.4', 32)]
+    >>> ip_networks_as_tuples([])
+    []
+    """
+    return map(ip_network_as_tuple, ip_network_strs)
+
+
+def ip_strs_to_ints(ip_strs):
+    """
+    The batch version of :func:`ip_str_to_int`.
+
+    Args:
+        `ip_strs`:
+            An iterable of IPv4 addresses (as :class:`str` or
+            :class:`unicode` strings).
+
+    Returns:
+        A :class:`numpy.ndarray` of :class:`numpy.uint32` (if NumPy
+        is available) or a :class:`list` of :class:`int` numbers.
+
+    >>> list(ip_strs_to_ints(['10.20.30.41', u'0.0.0.0', '255.255.255.255']))
+    [169090601, 0, 4294967295]
+    >>> list(ip_strs_to_ints(['10.20.30.41', '10.20.7721']))
+    [169090601, 169090601]
+    >>> len(ip_strs_to_ints([]))
+    0
+    >>> ip_strs_to_ints(['10.20.30.41', '10.20.30.x'])  # doctest: +ELLIPSIS
+    Traceback (most recent call last):
+      ...
+    error: ...
+    """
+    # (the conversion is done by C code, without a per-address loop
+    # in Python: all addresses are packed into one string of 4-byte
+    # big-endian numbers which is then converted as a whole)
+    packed = ''.join(map(socket.inet_aton, ip_strs))
+    if numpy is not None:
+        return numpy.frombuffer(packed, dtype='>u4').astype(numpy.uint32)
+    return list(struct.unpack('>{}I'.format(len(packed) // 4), packed))
+
+
+def ip_network_tuples_to_min_max_ips(ip_network_tuples):
+    """
+    The batch version of :func:`ip_network_tuple_to_min_max_ip`.
+
+    Args:
+        `ip_network_tuples`:
+            An iterable of ``(<IPv4 address as a string>, <prefix
+            length as an int>)`` tuples (e.g., cleaned values of an
+            :class:`~n6sdk.data_spec.fields.IPv4NetField`).
+
+    Returns:
+        A pair: ``(<minimum addresses>, <maximum addresses>)``; each of
+        them is a :class:`numpy.ndarray` of :class:`numpy.uint32` (if
+        NumPy is available) or a :class:`list` of :class:`int` numbers.
+
+    >>> min_ips, max_ips = ip_network_tuples_to_min_max_ips([
+    ...     ('10.20.30.41', 24),
+    ...     ('10.20.30.41', 32),
+    ...     ('10.20.30.41', 0),
+    ... ])
+    >>> list(min_ips)
+    [169090560, 169090601, 0]
+    >>> list(max_ips)
+    [169090815, 169090601, 4294967295]
+    >>> map(len, ip_network_tuples_to_min_max_ips([]))
+    [0, 0]
+    """
+    ip_network_tuples = list(ip_network_tuples)
+    ip_ints = ip_strs_to_ints(ip_str for ip_str, _ in ip_network_tuples)
+    net_ints = [net_int for _, net_int in ip_network_tuples]
+    if numpy is not None:
+        # (computing on uint64 to make shifting by 32 bits well-defined)
+        host_bits = 32 - numpy.array(net_ints, dtype=numpy.uint64)
+        net_masks = (numpy.uint64(0xFFFFFFFF) >> host_bits) << host_bits
+        ip_ints = ip_ints.astype(numpy.uint64)
+        min_ips = (ip_ints & net_masks).astype(numpy.uint32)
+        host_masks = net_masks ^ numpy.uint64(0xFFFFFFFF)
+        max_ips = (ip_ints | host_masks).astype(numpy.uint32)
+        return min_ips, max_ips
+    min_ips = []
+    max_ips = []
+    for ip_int, net_int in zip(ip_ints, net_ints):
+        host_bits = 32 - net_int
+        min_ips.append(((0xFFFFFFFF >> host_bits) << host_bits) & ip_int)
+        max_ips.append(((1 << host_bits) - 1) | ip_int)
+    return min_ips, max_ips
+
+
+
+#
+# IPv6 helpers
+
+def ipv6_network_tuple_to_min_max_ip(ipv6_network_tuple):
+    """
+    The IPv6 counterpart of :func:`ip_network_tuple_to_min_max_ip`.
+
+    Args:
+        `ipv6_network_tuple`:
+            An ``(<IPv6 address as a string>, <prefix length as an
+            int>)`` tuple (e.g., a cleaned value of an
+            :class:`~n6sdk.data_spec.fields.IPv6NetField`).
+
+    Returns:
+        A pair: ``(<minimum address>, <maximum address>)`` (both as
+        128-bit numbers).
+
+    >>> ipv6_network_tuple_to_min_max_ip(('2001:db8::1', 32)) == (
+    ...     0x20010db8000000000000000000000000,
+    ...     0x20010db8ffffffffffffffffffffffff)
+    True
+    >>> ipv6_network_tuple_to_min_max_ip(('2001:db8::1', 128)) == (
+    ...     0x20010db8000000000000000000000001,
+    ...     0x20010db8000000000000000000000001)
+    True
+    >>> ipv6_network_tuple_to_min_max_ip(('2001:db8::1', 0)) == (0, 2**128 - 1)
+    True
+    """
+    ipv6_str, net_int = ipv6_network_tuple
+    ipv6_int = ipv6_str_to_int(ipv6_str)
+    host_bits = 128 - net_int
+    min_ip = (((1 << net_int) - 1) << host_bits) & ipv6_int
+    max_ip = ((1 << host_bits) - 1) | ipv6_int
+    return min_ip, max_ip
+
+
+def ipv6_str_to_int(ipv6_str):
+    """
+    The IPv6 counterpart of :func:`ip_str_to_int`.
+
+    Returns:
+        The address as a (128-bit) number.
+
+    Raises:
+        :exc:`~exceptions.ValueError` if `ipv6_str` is not a valid IPv6
+        address.
+
+    >>> ipv6_str_to_int('::1')
+    1L
+    >>> ipv6_str_to_int(u'2001:0db8:85a3:0000:0000:8a2e:0370:7334') == (
+    ...     0x20010db885a3000000008a2e03707334)
+    True
+    >>> ipv6_str_to_int('::ffff:1.2.3.4') == 0xffff01020304
+    True
+    >>> ipv6_str_to_int('1::2::3')         # doctest: +IGNORE_EXCEPTION_DETAIL
+    Traceback (most recent call last):
+      ...
+    ValueError: ...
+    >>> ipv6_str_to_int('1.2.3.4')         # doctest: +IGNORE_EXCEPTION_DETAIL
+    Traceback (most recent call last):
+      ...
+    ValueError: ...
+    """
+    try:
+        return long(_ipv6_str_to_packed(ipv6_str).encode('hex'), 16)
+    except (socket.error, ipaddr.AddressValueError, UnicodeError):
+        raise ValueError('{!r} is not a valid IPv6 address'.format(ipv6_str))
+
+
+# (offsets of hextets in a 32-character hex representation of an address)
+_HEXTET_OFFSETS = range(0, 32, 4)
+
+
+def ipv6_int_to_exploded(ipv6_int):
+    """
+    Format an IPv6 address (given as a 128-bit number) in the
+    "exploded" form.
+
+    >>> ipv6_int_to_exploded(0x20010db885a3000000008a2e03707334)
+    '2001:0db8:85a3:0000:0000:8a2e:0370:7334'
+    >>> ipv6_int_to_exploded(1)
+    '0000:0000:0000:0000:0000:0000:0000:0001'
+    """
+    hex_str = '{:032x}'.format(ipv6_int)
+    return ':'.join([hex_str[i:i+4] for i in _HEXTET_OFFSETS])
+
+
+def ipv6_int_to_compressed(ipv6_int):
+    """
+    Format an IPv6 address (given as a 128-bit number) in the
+    "compressed" form (the same as produced by the :mod:`ipaddr`
+    library, i.e., compliant with :rfc:`5952`).
+
+    >>> ipv6_int_to_compressed(0x20010db885a3000000008a2e03707334)
+    '2001:db8:85a3::8a2e:370:7334'
+    >>> ipv6_int_to_compressed(1)
+    '::1'
+    >>> ipv6_int_to_compressed(0)
+    '::'
+    >>> ipv6_int_to_compressed(0x20010db8000000000000000000000000)
+    '2001:db8::'
+    >>> ipv6_int_to_compressed(0x00010002000300040005000600070000)
+    '1:2:3:4:5:6:7:0'
+    >>> ipv6_int_to_compressed(0x00010000000000020000000000030004)
+    '1::2:0:0:3:4'
+    >>> ipv6_int_to_compressed(0x00010000000000020000000000000003)
+    '1:0:0:2::3'
+    """
+    hex_str = '{:032x}'.format(ipv6_int)
+    hextets = [hex_str[i:i+4].lstrip('0') or '0' for i in _HEXTET_OFFSETS]
+    # find the first of the longest runs of (at least 2) zero hextets
+    best_start = best_len = 0
+    cur_start = cur_len = 0
+    for i, hextet in enumerate(hextets):
+        if hextet == '0':
+            if not cur_len:
+                cur_start = i
+            cur_len += 1
+            if cur_len > best_len:
+                best_start, best_len = cur_start, cur_len
+        else:
+            cur_len = 0
+    if best_len < 2:
+        return ':'.join(hextets)
+    return '{}::{}'.format(':'.join(hextets[:best_start]),
+                           ':'.join(hextets[best_start + best_len:]))
+
+
+if hasattr(socket, 'inet_pton'):
+    def _ipv6_str_to_packed(ipv6_str, _inet_pton=socket.inet_pton):
+        return _inet_pton(socket.AF_INET6, ipv6_str)
+else:
+    # (`socket.inet_pton()` is not available on some platforms)
+    def _ipv6_str_to_packed(ipv6_str):
+        return ipaddr.IPv6Address(ipv6_str).packed
+
+
+class _BaseIPNetworkIndex(object):
+
+    # (a base for IPv4NetworkIndex and IPv6NetworkIndex)
+
+    _network_tuple_to_min_max_ip = None  # to be set in subclasses
+    _ip_str_to_int = None                # to be set in subclasses
+
+    def __init__(self, ip_network_tuples):
+        min_max_ips = []
+        for min_ip, max_ip in sorted(map(self._network_tuple_to_min_max_ip,
+                                         ip_network_tuples)):
+            if min_max_ips and min_ip <= min_max_ips[-1][1] + 1:
+                # overlapping or adjacent to the previous range
+                if max_ip > min_max_ips[-1][1]:
+                    min_max_ips[-1] = (min_max_ips[-1][0], max_ip)
+            else:
+                min_max_ips.append((min_ip, max_ip))
+        #: A tuple of sorted, disjoint ``(<min ip>, <max ip>)`` pairs.
+        self.min_max_ips = tuple(min_max_ips)
+        self._min_ips = [min_ip for min_ip, _ in min_max_ips]
+        self._max_ips = [max_ip for _, max_ip in min_max_ips]
+
+    def __repr__(self):
+        return '<{} ({} address range(s))>'.format(
+            self.__class__.__name__,
+            len(self.min_max_ips))
+
+    def __contains__(self, ip):
+        if isinstance(ip, basestring):
+            ip = self._ip_str_to_int(ip)
+        i = bisect.bisect_right(self._min_ips, ip) - 1
+        return i >= 0 and ip <= self._max_ips[i]
+
+
+class IPv4NetworkIndex(_BaseIPNetworkIndex):
+
     """
-    return int(socket.inet_aton(ip_str).encode('hex'), 16)
+    An index of IPv4 networks, answering the question: *does the
+    given address belong to any of these networks?* -- in O(log n)
+    time (where n is the number of the networks).
+
+    Constructor args/kwargs:
+        `ip_network_tuples`:
+            An iterable of ``(<IPv4 address as a string>, <prefix
+            length as an int>)`` tuples (e.g., cleaned values of an
+            :class:`~n6sdk.data_spec.fields.IPv4NetField`, such as the
+            items of the ``ip.net`` query parameter's list).
+
+    The networks are converted to address ranges (see:
+    :func:`ip_network_tuple_to_min_max_ip`) which are then sorted and
+    merged (overlapping or adjacent ranges are joined), so that a
+    lookup is just a binary search.
+
+    Addresses to be looked up can be given as strings or as ints.
+
+    >>> index = IPv4NetworkIndex([
+    ...     ('10.20.30.41', 24),
+    ...     ('10.20.31.0', 24),     # (adjacent to the above one)
+    ...     ('192.168.0.1', 32),
+    ...     ('10.20.30.0', 25),     # (contained in the first one)
+    ... ])
+    >>> index.min_max_ips
+    ((169090560, 169091071), (3232235521, 3232235521))
+    >>> '10.20.30.0' in index
+    True
+    >>> u'10.20.31.255' in index
+    True
+    >>> '10.20.32.0' in index
+    False
+    >>> '192.168.0.1' in index
+    True
+    >>> 3232235521 in index
+    True
+    >>> '192.168.0.2' in index
+    False
+    >>> '0.0.0.0' in index
+    False
+    >>> list(index.contains_ips(['10.20.30.40', '10.20.29.255', u'0.0.0.0']))
+    [True, False, False]
+    >>> list(index.contains_ips(ip_strs_to_ints(['192.168.0.1', '1.1.1.1'])))
+    [True, False]
+    >>> list(index.contains_ips([3232235521, 3232235522]))
+    [True, False]
+    >>> list(IPv4NetworkIndex([]).contains_ips(['1.2.3.4']))
+    [False]
+    >>> index.contains_ips([2**32 + (10 << 24)])
+    Traceback (most recent call last):
+      ...
+    ValueError: IPv4 address ints must be in the range [0, 2**32)
+    >>> index.contains_ips([-1])
+    Traceback (most recent call last):
+      ...
+    ValueError: IPv4 address ints must be in the range [0, 2**32)
+
+    >>> '1.2.3.4' in IPv4NetworkIndex([])
+    False
+    >>> '1.2.3.4' in IPv4NetworkIndex([('5.6.7.8', 0)])
+    True
+    """
+
+    _network_tuple_to_min_max_ip = staticmethod(ip_network_tuple_to_min_max_ip)
+    _ip_str_to_int = staticmethod(ip_str_to_int)
+
+    def __init__(self, ip_network_tuples):
+        super(IPv4NetworkIndex, self).__init__(ip_network_tuples)
+        if numpy is not None:
+            # (for contains_ips())
+            self._min_ips_array = numpy.array(self._min_ips,
+                                              dtype=numpy.uint32)
+            self._max_ips_array = numpy.array(self._max_ips,
+                                              dtype=numpy.uint32)
+
+    def contains_ips(self, ips):
+        """
+        The batch version of the ``in`` test.
+
+        Args:
+            `ips`:
+                An iterable of IPv4 addresses (as strings) or a
+                sequence of ints (e.g., as returned by
+                :func:`ip_strs_to_ints`).
+
+        Returns:
+            A :class:`numpy.ndarray` of :class:`numpy.bool_` (if NumPy
+            is available) or a :class:`list` of :class:`bool` values.
+
+        Raises:
+            :exc:`~exceptions.ValueError` if any of the given ints is
+            not in the range ``[0, 2**32)``.
+        """
+        if numpy is None or not isinstance(ips, numpy.ndarray):
+            ips = list(ips)
+            if ips and isinstance(ips[0], basestring):
+                ips = ip_strs_to_ints(ips)
+        if numpy is None:
+            if ips:
+                _check_ipv4_int_range(min(ips), max(ips))
+            return [ip in self for ip in ips]
+        ips = numpy.asarray(ips)
+        if ips.size:
+            _check_ipv4_int_range(ips.min(), ips.max())
+        ips = ips.astype(numpy.uint32, copy=False)
+        if not self.min_max_ips:
+            return numpy.zeros(len(ips), dtype=numpy.bool_)
+        indexes = numpy.searchsorted(self._min_ips_array, ips,
+                                     side='right') - 1
+        return (indexes >= 0) & (ips <= self._max_ips_array[indexes])
+
+
+def _check_ipv4_int_range(min_ip, max_ip):
+    # (to prevent silent wrapping when casting to numpy.uint32)
+    if min_ip < 0 or max_ip > 0xFFFFFFFF:
+        raise ValueError('IPv4 address ints must be in the range [0, 2**32)')
+
+
+class IPv6NetworkIndex(_BaseIPNetworkIndex):
+
+    """
+    The IPv6 counterpart of :class:`IPv4NetworkIndex`.
+
+    Constructor args/kwargs:
+        `ip_network_tuples`:
+            An iterable of ``(<IPv6 address as a string>, <prefix
+            length as an int>)`` tuples (e.g., cleaned values of an
+            :class:`~n6sdk.data_spec.fields.IPv6NetField`, such as the
+            items of the ``ipv6.net`` query parameter's list).
+
+    Addresses to be looked up can be given as strings or as (128-bit)
+    numbers.
+
+    >>> index = IPv6NetworkIndex([
+    ...     (u'2001:0db8:0000:0000:0000:0000:0000:0000', 32),
+    ...     (u'2001:0db9:0000:0000:0000:0000:0000:0000', 32),  # (adjacent)
+    ...     (u'0000:0000:0000:0000:0000:0000:0000:0001', 128),
+    ... ])
+    >>> len(index.min_max_ips)
+    2
+    >>> '2001:db8::1' in index
+    True
+    >>> '2001:db9:ffff:ffff:ffff:ffff:ffff:ffff' in index
+    True
+    >>> '2001:dba::' in index
+    False
+    >>> '::1' in index
+    True
+    >>> 1 in index
+    True
+    >>> '::2' in index
+    False
+    >>> '::1' in IPv6NetworkIndex([])
+    False
+    """
+
+    _network_tuple_to_min_max_ip = staticmethod(
+        ipv6_network_tuple_to_min_max_ip)
+    _ip_str_to_int = staticmethod(ipv6_str_to_int)
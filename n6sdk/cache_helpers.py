@@ -0,0 +1,140 @@
+# -*- coding: utf-8 -*-
+
+# Copyright (c) 2016 NASK. All rights reserved.
+
+
+import threading
+
+
+# indexes of the items of LRUCache's linked list "links"
+_PREV, _NEXT, _KEY, _VALUE = 0, 1, 2, 3
+
+
+class LRUCache(object):
+
+    """
+    A simple, size-limited, thread-safe *least recently used* cache.
+
+    Constructor args/kwargs:
+        `maxsize` (:class:`int`):
+            The maximum number of items kept in the cache (must be
+            greater than or equal to 1).
+
+    The cache provides a minimal mapping-like interface:
+    :meth:`get`, ``__setitem__``, ``__contains__``, ``__len__`` and
+    :meth:`clear`.  When a new item is to be added to an already full
+    cache, the least recently used (got or set) item is evicted.
+
+    The :attr:`hits` and :attr:`misses` attributes count successful
+    and unsuccessful :meth:`get` calls.
+
+    >>> cache = LRUCache(maxsize=2)
+    >>> cache['a'] = 1
+    >>> cache['b'] = 2
+    >>> cache.get('a')
+    1
+    >>> cache['c'] = 3            # 'b' is the least recently used one
+    >>> 'b' in cache
+    False
+    >>> cache.get('b') is None
+    True
+    >>> cache.get('b', 'default')
+    'default'
+    >>> cache.get('a'), cache.get('c')
+    (1, 3)
+    >>> len(cache)
+    2
+    >>> cache.hits, cache.misses
+    (3, 2)
+    >>> cache['a'] = 42           # (updating an existing item)
+    >>> cache['d'] = 4            # now 'c' is the least recently used one
+    >>> sorted([k for k in 'abcd' if k in cache])
+    ['a', 'd']
+    >>> cache.get('a')
+    42
+    >>> cache.clear()
+    >>> len(cache), cache.hits, cache.misses
+    (0, 0, 0)
+
+    >>> LRUCache(maxsize=0)       # doctest: +IGNORE_EXCEPTION_DETAIL
+    Traceback (most recent call last):
+      ...
+    ValueError: ...
+    """
+
+    def __init__(self, maxsize):
+        if maxsize < 1:
+            raise ValueError('maxsize should not be lesser than 1 ({!r} given)'
+                             .format(maxsize))
+        self.maxsize = maxsize
+        self._lock = threading.Lock()
+        self._key_to_link = {}
+        # the root of a circular doubly linked list (the most recently
+        # used item is root[_NEXT], the least recently used one is
+        # root[_PREV]); each link is a [prev, next, key, value] list
+        self._root = root = []
+        root[:] = [root, root, None, None]
+        self.hits = 0
+        self.misses = 0
+
+    def __repr__(self):
+        return '<{} (maxsize={!r}, len={!r}, hits={!r}, misses={!r})>'.format(
+            self.__class__.__name__,
+            self.maxsize,
+            len(self),
+            self.hits,
+            self.misses)
+
+    def __len__(self):
+        return len(self._key_to_link)
+
+    def __contains__(self, key):
+        return key in self._key_to_link
+
+    def get(self, key, default=None):
+        with self._lock:
+            link = self._key_to_link.get(key)
+            if link is None:
+                self.misses += 1
+                return default
+            self.hits += 1
+            self._move_to_front(link)
+            return link[_VALUE]
+
+    def __setitem__(self, key, value):
+        with self._lock:
+            link = self._key_to_link.get(key)
+            if link is not None:
+                link[_VALUE] = value
+                self._move_to_front(link)
+                return
+            root = self._root
+            if len(self._key_to_link) >= self.maxsize:
+                # evict the least recently used item
+                oldest = root[_PREV]
+                oldest[_PREV][_NEXT] = root
+                root[_PREV] = oldest[_PREV]
+                del self._key_to_link[oldest[_KEY]]
+            first = root[_NEXT]
+            link = [root, first, key, value]
+            first[_PREV] = root[_NEXT] = link
+            self._key_to_link[key] = link
+
+    def clear(self):
+        with self._lock:
+            self._key_to_link.clear()
+            root = self._root
+            root[:] = [root, root, None, None]
+            self.hits = 0
+            self.misses = 0
+
+    def _move_to_front(self, link):
+        # (to be called with the lock acquired)
+        root = self._root
+        prev, next_ = link[_PREV], link[_NEXT]
+        prev[_NEXT] = next_
+        next_[_PREV] = prev
+        first = root[_NEXT]
+        link[_PREV] = root
+        link[_NEXT] = first
+        first[_PREV] = root[_NEXT] = link
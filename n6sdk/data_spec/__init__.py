@@ -11,9 +11,11 @@
 
 
 import collections
+import functools
 
 from pyramid.decorator import reify
 
+from n6sdk.cache_helpers import LRUCache
 from n6sdk.data_spec.fields import (
     Field,
     AnonymizedIPv4Field,
@@ -165,6 +167,31 @@ class Ext(dict):
 
 
 
+#
+# Auxiliary functions
+
+# (keyword arguments of BaseDataSpec.clean_result_dict() that are
+# supported by the fast path of BaseDataSpec.make_result_dict_cleaner())
+_STANDARD_CLEAN_RESULT_DICT_KWARGS = frozenset([
+    'ignored_keys',
+    'forbidden_keys',
+    'extra_required_keys',
+    'discarded_keys',
+])
+
+
+def _converted_values_dict(clean_result_dict, value_converter, result):
+    # (used by BaseDataSpec.make_result_dict_cleaner() if the
+    # clean_result_dict() method has been overridden)
+    converted = {}
+    for key, value in clean_result_dict(result).iteritems():
+        value = value_converter(value)
+        if value is not None:
+            converted[key] = value
+    return converted
+
+
+
 #
 # The abstract base class for any data specification classes
 
@@ -178,12 +205,29 @@ class BaseDataSpec(object):
     subclass of it.
     """
 
+    #: The maximum number of distinct result key sets ("shapes") whose
+    #: key cleaning outcomes are memoized by a single result dict
+    #: cleaner (see: :meth:`make_result_dict_cleaner`); when the limit
+    #: is reached, the least recently used outcome is evicted.
+    result_dict_cleaner_max_shapes = 1024
+
+    #: The maximum number of key cleaning outcomes memoized (per data
+    #: specification instance) by the :meth:`clean_param_dict`,
+    #: :meth:`clean_param_keys`, :meth:`clean_result_dict` and
+    #: :meth:`clean_result_keys` methods -- each outcome for a
+    #: particular set of given keys *and* particular values of the
+    #: optional keyword arguments; when the limit is reached, the
+    #: least recently used outcome is evicted.
+    key_cleaning_cache_max_size = 1024
+
     def __init__(self, **kwargs):
         self._all_param_fields = {}
         self._required_param_fields = {}
         self._single_param_fields = {}
         self._all_result_fields = {}
         self._required_result_fields = {}
+        self._key_cleaning_cache = LRUCache(
+            maxsize=self.key_cleaning_cache_max_size)
 
         self._set_fields()
 
@@ -229,11 +273,14 @@ class BaseDataSpec(object):
                          forbidden_keys=(),
                          extra_required_keys=(),
                          discarded_keys=()):
-        keys = self._clean_keys(
-            params.viewkeys() - frozenset(ignored_keys),
-            self._all_param_fields.viewkeys() - frozenset(forbidden_keys),
-            self._required_param_fields.viewkeys() | frozenset(extra_required_keys),
-            frozenset(discarded_keys),
+        keys = self._clean_keys_memoized(
+            params,
+            ignored_keys,
+            forbidden_keys,
+            extra_required_keys,
+            discarded_keys,
+            self._all_param_fields,
+            self._required_param_fields,
             exc_class=ParamKeyCleaningError)
         return dict(self._iter_clean_param_items(params, keys))
 
@@ -246,12 +293,15 @@ class BaseDataSpec(object):
                          forbidden_keys=(),
                          extra_required_keys=(),
                          discarded_keys=()):
-        return self._clean_keys(
-            params.viewkeys() - frozenset(ignored_keys),
-            self._all_param_fields.viewkeys() - frozenset(forbidden_keys),
-            self._required_param_fields.viewkeys() | frozenset(extra_required_keys),
-            frozenset(discarded_keys),
-            exc_class=ParamKeyCleaningError)
+        return set(self._clean_keys_memoized(
+            params,
+            ignored_keys,
+            forbidden_keys,
+            extra_required_keys,
+            discarded_keys,
+            self._all_param_fields,
+            self._required_param_fields,
+            exc_class=ParamKeyCleaningError))
 
     def param_field_specs(self, which='all', multi=True, single=True):
         field_items = self._filter_by_which(which,
@@ -273,14 +323,118 @@ class BaseDataSpec(object):
                           forbidden_keys=(),
                           extra_required_keys=(),
                           discarded_keys=()):
-        keys = self._clean_keys(
-            result.viewkeys() - frozenset(ignored_keys),
-            self._all_result_fields.viewkeys() - frozenset(forbidden_keys),
-            self._required_result_fields.viewkeys() | frozenset(extra_required_keys),
-            frozenset(discarded_keys),
+        keys = self._clean_keys_memoized(
+            result,
+            ignored_keys,
+            forbidden_keys,
+            extra_required_keys,
+            discarded_keys,
+            self._all_result_fields,
+            self._required_result_fields,
             exc_class=ResultKeyCleaningError)
         return dict(self._iter_clean_result_items(result, keys))
 
+    def make_result_dict_cleaner(self, value_converter=None, **kwargs):
+        """
+        Make a callable that cleans result dictionaries.
+
+        Kwargs:
+            Any keyword arguments accepted by :meth:`clean_result_dict`
+            (for :class:`BaseDataSpec` these are: `ignored_keys`,
+            `forbidden_keys`, `extra_required_keys` and
+            `discarded_keys`; an overridden version of the method may
+            accept also other ones), plus:
+
+            `value_converter` (default: :obj:`None`):
+                If not :obj:`None`, a callable that takes a cleaned
+                value and returns the value to be placed in the
+                resultant dictionary instead of it or :obj:`None` --
+                to omit the respective key.  It allows the consumer of
+                the cleaned dictionaries (e.g., a renderer) to get them
+                in the final form it needs without making their
+                copies.
+
+        Returns:
+            A callable that takes one argument, a result dictionary,
+            and returns a new (cleaned) dictionary -- behaving exactly
+            like :meth:`clean_result_dict` called with the given
+            keyword arguments (except for `value_converter`, if
+            specified).
+
+        The key sets are computed once, when this method is called, and
+        the outcome of key cleaning is memoized per each distinct set of
+        result keys (i.e., per *shape* of result dictionaries -- see
+        also: :attr:`result_dict_cleaner_max_shapes`).  Therefore, using
+        the returned callable is significantly faster than calling
+        :meth:`clean_result_dict` again and again (with the same keyword
+        arguments) for a lot of result dictionaries.
+
+        .. note::
+
+           If :meth:`clean_result_dict` is overridden in a subclass
+           (and this method is not), or if any keyword arguments other
+           than the standard ones (listed above) are given, the
+           returned callable just calls :meth:`clean_result_dict` with
+           the given keyword arguments (so that any customizations are
+           respected).
+        """
+        if (type(self).clean_result_dict.__func__ is not (
+                BaseDataSpec.clean_result_dict.__func__) or
+              not kwargs.viewkeys() <= _STANDARD_CLEAN_RESULT_DICT_KWARGS):
+            clean_result_dict = functools.partial(self.clean_result_dict,
+                                                  **kwargs)
+            if value_converter is None:
+                return clean_result_dict
+            return functools.partial(_converted_values_dict,
+                                     clean_result_dict,
+                                     value_converter)
+        return self._make_result_dict_cleaner(
+            frozenset(kwargs.get('ignored_keys', ())),
+            frozenset(self._all_result_fields.viewkeys() -
+                      frozenset(kwargs.get('forbidden_keys', ()))),
+            frozenset(self._required_result_fields.viewkeys() |
+                      frozenset(kwargs.get('extra_required_keys', ()))),
+            frozenset(kwargs.get('discarded_keys', ())),
+            value_converter)
+
+    #: .. note::
+    #:    The method should **never** modify the given dictionaries (or
+    #:    any of their values).  It should always yield new dictionaries.
+    def clean_result_dicts(self, results,
+                           # optional keyword arguments:
+                           ignored_keys=(),
+                           forbidden_keys=(),
+                           extra_required_keys=(),
+                           discarded_keys=()):
+        """
+        Clean the given result dictionaries, yielding the cleaned ones.
+
+        Args:
+            `results`:
+                An iterable of result dictionaries.
+
+        Kwargs:
+            The same as for :meth:`clean_result_dict`.
+
+        Yields:
+            Consecutive cleaned dictionaries (as
+            :meth:`clean_result_dict` would return them).
+
+        Raises:
+            The same exceptions as :meth:`clean_result_dict` (note that
+            the first error ends the iteration).
+
+        The key cleaning is done only once per each distinct set of
+        result keys (see: :meth:`make_result_dict_cleaner`).
+        """
+        result_dict_cleaner = self.make_result_dict_cleaner(
+            ignored_keys=ignored_keys,
+            forbidden_keys=forbidden_keys,
+            extra_required_keys=extra_required_keys,
+            discarded_keys=discarded_keys)
+        for result in results:
+            yield result_dict_cleaner(result)
+
     #: .. note::
     #:    The method should **never** modify the given dictionary (or any
     #:    of its values).
@@ -290,12 +444,15 @@ class BaseDataSpec(object):
                           forbidden_keys=(),
                           extra_required_keys=(),
                           discarded_keys=()):
-        return self._clean_keys(
-            result.viewkeys() - frozenset(ignored_keys),
-            self._all_result_fields.viewkeys() - frozenset(forbidden_keys),
-            self._required_result_fields.viewkeys() | frozenset(extra_required_keys),
-            frozenset(discarded_keys),
-            exc_class=ResultKeyCleaningError)
+        return set(self._clean_keys_memoized(
+            result,
+            ignored_keys,
+            forbidden_keys,
+            extra_required_keys,
+            discarded_keys,
+            self._all_result_fields,
+            self._required_result_fields,
+            exc_class=ResultKeyCleaningError))
 
     def result_field_specs(self, which='all'):
         return dict(self._filter_by_which(which,
@@ -372,6 +529,40 @@ class BaseDataSpec(object):
             for extra in self._iter_extra_param_specs(xkey, xfield):
                 yield extra
 
+    def _clean_keys_memoized(self, given_dict, ignored_keys, forbidden_keys,
+                             extra_required_keys, discarded_keys,
+                             all_fields, required_fields, exc_class):
+        # (the result is a frozenset or an `exc_class` error is raised)
+        cache_key = (exc_class, frozenset(given_dict), ignored_keys,
+                     forbidden_keys, extra_required_keys, discarded_keys)
+        try:
+            cached = self._key_cleaning_cache.get(cache_key)
+        except TypeError:
+            # (some of the keyword arguments are not hashable, e.g., lists)
+            cache_key = cache_key[:2] + tuple(map(frozenset, cache_key[2:]))
+            cached = self._key_cleaning_cache.get(cache_key)
+        if cached is None:
+            try:
+                keys = self._clean_keys(
+                    given_dict.viewkeys() - frozenset(ignored_keys),
+                    all_fields.viewkeys() - frozenset(forbidden_keys),
+                    (required_fields.viewkeys() |
+                     frozenset(extra_required_keys)),
+                    frozenset(discarded_keys),
+                    exc_class=exc_class)
+            except exc_class as exc:
+                cached = (frozenset(exc.illegal_keys),
+                          frozenset(exc.missing_keys)), None
+                self._key_cleaning_cache[cache_key] = cached
+                raise
+            cached = None, frozenset(keys)
+            self._key_cleaning_cache[cache_key] = cached
+        key_error_args, keys = cached
+        if key_error_args is not None:
+            illegal_keys, missing_keys = key_error_args
+            raise exc_class(set(illegal_keys), set(missing_keys))
+        return keys
+
     @staticmethod
     def _clean_keys(keys, legal_keys, required_keys, discarded_keys,
                     exc_class):
@@ -426,6 +617,72 @@ class BaseDataSpec(object):
         if error_info_seq:
             raise ResultValueCleaningError(error_info_seq)
 
+    def _make_result_dict_cleaner(self, ignored_keys, legal_keys,
+                                  required_keys, discarded_keys,
+                                  value_converter=None):
+        # (all arguments except `value_converter` should be frozensets)
+        shape_to_memo_item = LRUCache(
+            maxsize=self.result_dict_cleaner_max_shapes)
+        all_result_fields = self._all_result_fields
+        clean_keys = self._clean_keys
+
+        def make_memo_item(shape):
+            # called once per distinct set of result keys ("shape")
+            try:
+                keys = clean_keys(
+                    shape - ignored_keys,
+                    legal_keys,
+                    required_keys,
+                    discarded_keys,
+                    exc_class=ResultKeyCleaningError)
+            except ResultKeyCleaningError as exc:
+                memo_item = (exc.illegal_keys, exc.missing_keys), None
+            else:
+                memo_item = None, tuple(
+                    (key, all_result_fields[key].clean_result_value)
+                    for key in keys)
+            shape_to_memo_item[shape] = memo_item
+            return memo_item
+
+        def result_dict_cleaner(
+                result,
+                # [the following constants are placed here as
+                # pseudo-arguments just for efficiency (local variable
+                # lookups are faster than global/closure lookups)]
+                _frozenset=frozenset,
+                _get_memo_item=shape_to_memo_item.get,
+                _make_memo_item=make_memo_item,
+                _set=set,
+                _convert=value_converter):
+            shape = _frozenset(result)
+            memo_item = _get_memo_item(shape)
+            if memo_item is None:
+                memo_item = _make_memo_item(shape)
+            key_error_args, cleaning_items = memo_item
+            if key_error_args is not None:
+                illegal_keys, missing_keys = key_error_args
+                raise ResultKeyCleaningError(_set(illegal_keys),
+                                             _set(missing_keys))
+            cleaned_result = {}
+            error_info_seq = []
+            for key, clean_value in cleaning_items:
+                value = result[key]
+                try:
+                    cleaned_value = clean_value(value)
+                except Exception as exc:
+                    error_info_seq.append((key, value, exc))
+                    continue
+                if _convert is not None:
+                    cleaned_value = _convert(cleaned_value)
+                    if cleaned_value is None:
+                        continue
+                cleaned_result[key] = cleaned_value
+            if error_info_seq:
+                raise ResultValueCleaningError(error_info_seq)
+            return cleaned_result
+
+        return result_dict_cleaner
+
     @staticmethod
     def _filter_by_which(which, all_fields, required_fields):
         # select fields that match the `which` argument
@@ -14,13 +14,17 @@
 
 import collections
 import datetime
+import functools
 import re
 
-import ipaddr
-
 from n6sdk.addr_helpers import (
     ip_network_as_tuple,
+    ip_strict_str_to_int,
+    ipv6_int_to_compressed,
+    ipv6_int_to_exploded,
+    ipv6_str_to_int,
 )
+from n6sdk.cache_helpers import LRUCache
 from n6sdk.datetime_helpers import (
     datetime_utc_normalize,
     parse_iso_datetime_to_utc,
@@ -87,9 +91,36 @@ class Field(object):
       attributes (see the second point in the paragraph above).
     """
 
+    #: The maximum number of recently cleaned values kept in the
+    #: per-field-instance LRU cache -- if it is not :obj:`None` (nor
+    #: `0`), :meth:`clean_param_value` and :meth:`clean_result_value`
+    #: look up the given value in the cache before cleaning it (the
+    #: cache is available as the :attr:`cleaned_values_cache` instance
+    #: attribute, whose ``hits`` and ``misses`` counters can be read).
+    #:
+    #: Intended to be used for fields whose values are often repeated
+    #: (see, e.g., :class:`UnicodeEnumField`) or expensive to clean
+    #: (see, e.g., :class:`IPv6Field`).  The cache should be enabled
+    #: *only* for fields whose cleaned values are *immutable* and whose
+    #: cleaning methods are *pure functions* of the given value (as the
+    #: same cleaned value object is returned for equal given values of
+    #: the same type).  Only string (:class:`str`/:class:`unicode`)
+    #: values are cached; cleaning errors are never cached.
+    cleaned_values_cache_max_size = None
+
     def __init__(self, **kwargs):
         self._init_kwargs = kwargs
         self._set_public_attrs(**kwargs)
+        #: An :class:`~n6sdk.cache_helpers.LRUCache` instance or
+        #: :obj:`None` (see: :attr:`cleaned_values_cache_max_size`).
+        self.cleaned_values_cache = None
+        if self.cleaned_values_cache_max_size:
+            self.cleaned_values_cache = LRUCache(
+                maxsize=self.cleaned_values_cache_max_size)
+            self.clean_param_value = self._make_caching_cleaner(
+                self.clean_param_value, 'param')
+            self.clean_result_value = self._make_caching_cleaner(
+                self.clean_result_value, 'result')
 
     def __repr__(self):
         return '{}({})'.format(
@@ -180,6 +211,29 @@ class Field(object):
             else {})
         self._set_per_instance_attrs(per_instance_attrs)
 
+    def _make_caching_cleaner(self, clean, form_label):
+        cache = self.cleaned_values_cache
+
+        @functools.wraps(clean)
+        def caching_clean(value,
+                          # [the following constants are placed here as
+                          # pseudo-arguments just for efficiency (local
+                          # variable lookups are faster than dict-based
+                          # global/builtin lookups)]
+                          _get_cached=cache.get,
+                          _isinstance=isinstance,
+                          _basestring=basestring):
+            if not _isinstance(value, _basestring):
+                return clean(value)
+            # (the type is a part of the key to be on the safe side)
+            cache_key = form_label, value.__class__, value
+            cleaned_value = _get_cached(cache_key)
+            if cleaned_value is None:
+                cleaned_value = cache[cache_key] = clean(value)
+            return cleaned_value
+
+        return caching_clean
+
     def _in_arg_checked(self, arg):
         if arg not in (None, 'required', 'optional'):
             raise ValueError("{!r} is not one of: None, 'required', 'optional'"
@@ -206,6 +260,12 @@ class DateTimeField(Field):
 
     """
     For date-and-time (timestamp) values, automatically normalized to UTC.
+
+    If the constructor-argument-or-subclass-attribute
+    :attr:`~Field.cleaned_values_cache_max_size` is set, parsed
+    date+time strings are cached -- which makes sense when many values
+    are identical (e.g., when a data backend returns many records with
+    the same timestamps).
     """
 
     def clean_param_value(self, value):
@@ -364,11 +424,15 @@ class UnicodeEnumField(UnicodeField):
     For text data limited to a finite set of possible values.
 
     The constructor-argument-or-subclass-attribute :attr:`enum_values`
-    (a sequence or set of strings) is obligatory.
+    (a sequence or set of strings) is obligatory.  (Note that membership
+    of values is checked using a :class:`frozenset` -- so large sets of
+    enumerated values are also handled efficiently.)
     """
 
     enum_values = None
 
+    cleaned_values_cache_max_size = 1000
+
     def __init__(self, **kwargs):
         super(UnicodeEnumField, self).__init__(**kwargs)
         if self.enum_values is None:
@@ -377,10 +441,12 @@ class UnicodeEnumField(UnicodeField):
                             "as a constructor argument)"
                             .format(self.__class__.__name__))
         self.enum_values = tuple(as_unicode(v) for v in self.enum_values)
+        # (the tuple is kept to preserve the order in error messages)
+        self._enum_values_frozenset = frozenset(self.enum_values)
 
     def _validate_value(self, value):
         super(UnicodeEnumField, self)._validate_value(value)
-        if value not in self.enum_values:
+        if value not in self._enum_values_frozenset:
             raise FieldValueError(public_message=(
                 u'"{}" is not one of: {}'.format(
                     ascii_str(value),
@@ -471,6 +537,8 @@ class SourceField(UnicodeLimitedField, UnicodeRegexField):
     error_msg_template = '"{}" is not a valid source specification'
     max_length = 32
 
+    cleaned_values_cache_max_size = 1000
+
 
 class IPv4Field(UnicodeLimitedField, UnicodeRegexField):
 
@@ -478,12 +546,34 @@ class IPv4Field(UnicodeLimitedField, UnicodeRegexField):
     For IPv4 addresses, such as ``127.234.5.17``.
 
     (Using decimal dotted-quad notation.)
+
+    When cleaning a parameter value, by default a unicode string is
+    returned; but if the constructor-argument-or-subclass-attribute
+    :attr:`param_value_as_int` is true, the address is returned as an
+    :class:`int` number (e.g., ``2140800273`` for ``127.154.5.17``)
+    -- validated and converted in one pass, so that data backends do
+    not need to parse the address again (e.g., to compare it with
+    address ranges).  Cleaning result values is not affected.
     """
 
     regex = IPv4_STRICT_DECIMAL_REGEX
     error_msg_template = '"{}" is not a valid IPv4 address'
     max_length = 15  # <- formally redundant but may improve introspection
 
+    #: Whether :meth:`clean_param_value` should return an :class:`int`
+    #: (instead of a :class:`unicode` string).
+    param_value_as_int = False
+
+    def clean_param_value(self, value):
+        if not self.param_value_as_int:
+            return super(IPv4Field, self).clean_param_value(value)
+        assert isinstance(value, basestring)
+        try:
+            return ip_strict_str_to_int(value)
+        except ValueError:
+            raise FieldValueError(public_message=(
+                self.error_msg_template.format(ascii_str(value))))
+
 
 class IPv6Field(UnicodeField):
 
@@ -498,27 +588,33 @@ class IPv6Field(UnicodeField):
 
     * when cleaning a result value -- the address is normalized to a
       "compressed" form, such as ``u'2001:db8:85a3::8a2e:370:7334'``.
+
+    Recently cleaned values are kept in an LRU cache (see the
+    :attr:`~Field.cleaned_values_cache_max_size` constructor-argument-or-
+    subclass-attribute).
     """
 
     error_msg_template = '"{}" is not a valid IPv6 address'
     max_length = 39  # <- not used at all but may improve introspection
 
+    cleaned_values_cache_max_size = 1000
+
     def clean_param_value(self, value):
-        ipv6_obj = super(IPv6Field, self).clean_param_value(value)
-        return unicode(ipv6_obj.exploded)
+        ipv6_int = super(IPv6Field, self).clean_param_value(value)
+        return unicode(ipv6_int_to_exploded(ipv6_int))
 
     def clean_result_value(self, value):
-        ipv6_obj = super(IPv6Field, self).clean_result_value(value)
-        return unicode(ipv6_obj.compressed)
+        ipv6_int = super(IPv6Field, self).clean_result_value(value)
+        return unicode(ipv6_int_to_compressed(ipv6_int))
 
     def _fix_value(self, value):
         value = super(IPv6Field, self)._fix_value(value)
         try:
-            ipv6_obj = ipaddr.IPv6Address(value)
-        except Exception:
+            ipv6_int = ipv6_str_to_int(value)
+        except ValueError:
             raise FieldValueError(public_message=(
                 self.error_msg_template.format(ascii_str(value))))
-        return ipv6_obj
+        return ipv6_int
 
 
 class AnonymizedIPv4Field(UnicodeLimitedField, UnicodeRegexField):
@@ -596,16 +692,21 @@ class IPv6NetField(UnicodeField):
       * a unicode string is returned;
       * the address part is normalized to a "compressed" form, such as
         ``u'2001:db8:85a3::8a2e:370:7334'``.
+
+    Recently cleaned values are kept in an LRU cache (see the
+    :attr:`~Field.cleaned_values_cache_max_size` constructor-argument-or-
+    subclass-attribute).
     """
 
     error_msg_template = ('"{}" is not a valid CIDR '
                           'IPv6 network specification')
     max_length = 43  # <- not used at all but may improve introspection
 
+    cleaned_values_cache_max_size = 1000
+
     def clean_param_value(self, value):
-        ipv6_network_obj = super(IPv6NetField, self).clean_param_value(value)
-        ipv6 = unicode(ipv6_network_obj.ip.exploded)
-        net = ipv6_network_obj.prefixlen
+        ipv6_int, net = super(IPv6NetField, self).clean_param_value(value)
+        ipv6 = unicode(ipv6_int_to_exploded(ipv6_int))
         assert isinstance(ipv6, unicode)
         assert isinstance(net, int) and 0 <= net <= 128
         # returning a tuple: ipv6 is a unicode string, net is an int number
@@ -619,20 +720,29 @@ class IPv6NetField(UnicodeField):
             except (ValueError, TypeError):
                 raise FieldValueError(public_message=(
                     self.error_msg_template.format(ascii_str(value))))
-        ipv6_network_obj = super(IPv6NetField, self).clean_result_value(value)
+        ipv6_int, net = super(IPv6NetField, self).clean_result_value(value)
         # returning a unicode string
-        return unicode(ipv6_network_obj.compressed)
-
-    def _fix_value(self, value):
+        return u'{}/{}'.format(ipv6_int_to_compressed(ipv6_int), net)
+
+    def _fix_value(
+            self, value,
+            # [the following constant is placed here as a pseudo-argument
+            # just for efficiency (local variable lookups are faster than
+            # dict-based global/builtin lookups)]
+            _decimal_digits=frozenset(u'0123456789')):
         value = super(IPv6NetField, self)._fix_value(value)
         try:
-            if '/' not in value:
+            ipv6_str, net_str = value.split(u'/')
+            if not (net_str and _decimal_digits.issuperset(net_str)):
                 raise ValueError
-            ipv6_network_obj = ipaddr.IPv6Network(value)
-        except Exception:
+            net = int(net_str)
+            if net > 128:
+                raise ValueError
+            ipv6_int = ipv6_str_to_int(ipv6_str)
+        except ValueError:
             raise FieldValueError(public_message=(
                 self.error_msg_template.format(ascii_str(value))))
-        return ipv6_network_obj
+        return ipv6_int, net
 
 
 class CCField(UnicodeLimitedField, UnicodeRegexField):
@@ -645,6 +755,8 @@ class CCField(UnicodeLimitedField, UnicodeRegexField):
     error_msg_template = '"{}" is not a valid 2-character country code'
     max_length = 2   # <- formally redundant but may improve introspection
 
+    cleaned_values_cache_max_size = 1000
+
     def _fix_value(self, value):
         value = super(CCField, self)._fix_value(value)
         return value.upper()
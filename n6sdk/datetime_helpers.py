@@ -11,6 +11,7 @@
 import calendar
 import datetime
 
+from n6sdk.cache_helpers import LRUCache
 from n6sdk.regexes import (
     ISO_DATE_REGEX,
     ISO_TIME_REGEX,
@@ -126,13 +127,27 @@ def datetime_utc_normalize(dt):
     >>> datetime_utc_normalize(naive_dt)
     datetime.datetime(2013, 6, 6, 12, 13, 57, 251211)
 
+    >>> datetime_utc_normalize(naive_dt) is naive_dt  # (no need to copy it)
+    True
+
     >>> tzinfo = FixedOffsetTimezone(120)
     >>> tz_aware_dt = datetime.datetime(2013, 6, 6, 14, 13, 57, 251211,
     ...                                 tzinfo=tzinfo)
     >>> datetime_utc_normalize(tz_aware_dt)
     datetime.datetime(2013, 6, 6, 12, 13, 57, 251211)
+
+    >>> tz_aware_dt = datetime.datetime(2013, 6, 6, 0, 13, 57, 999999,
+    ...                                 tzinfo=FixedOffsetTimezone(-570))
+    >>> datetime_utc_normalize(tz_aware_dt)
+    datetime.datetime(2013, 6, 6, 9, 43, 57, 999999)
     """
-    return datetime.datetime.utcfromtimestamp(datetime_to_utc_timestamp(dt))
+    # (note: no conversion to/from a float timestamp -- that would be
+    # slower and could lose precision)
+    utc_offset = dt.utcoffset()
+    if utc_offset is None:
+        # a naive datetime (or an aware one but with unknown UTC offset)
+        return dt.replace(tzinfo=None) if dt.tzinfo is not None else dt
+    return (dt - utc_offset).replace(tzinfo=None)
 
 
 # TODO -- better tests:
@@ -305,9 +320,48 @@ def parse_iso_datetime(s, prestrip=True):
 
     For notes about some limitations -- see :func:`parse_iso_date` and
     :func:`parse_iso_time`.
+
+    The most common form of input, i.e., ``YYYY-MM-DDThh:mm:ss``
+    (where ``T`` can also be a space) optionally followed by a
+    fractional part of second and/or by ``Z``, is parsed on a fast path
+    (without regular expression matching); any other forms are handled
+    by the general (regex-based) parser.
+
+    >>> parse_iso_datetime('2013-06-13T10:02:04')
+    datetime.datetime(2013, 6, 13, 10, 2, 4)
+    >>> parse_iso_datetime(u'2013-06-13 10:02:04.1234Z')
+    datetime.datetime(2013, 6, 13, 10, 2, 4, 123400)
+    >>> parse_iso_datetime('2013-06-13T10:02:04.123456789')
+    datetime.datetime(2013, 6, 13, 10, 2, 4, 123456)
+    >>> parse_iso_datetime('2013-06-13T24:00:00')
+    datetime.datetime(2013, 6, 14, 0, 0)
+    >>> parse_iso_datetime('2013-06-13T10:02:60')
+    datetime.datetime(2013, 6, 13, 10, 2, 59, 999999)
+    >>> parse_iso_datetime('2013-06-13T10:02:04+01:00')
+    datetime.datetime(2013, 6, 13, 10, 2, 4, tzinfo=FixedOffsetTimezone(60))
+    >>> parse_iso_datetime('2013-W24-4T10:02:04Z')
+    datetime.datetime(2013, 6, 13, 10, 2, 4)
+    >>> parse_iso_datetime('2013-02-29T10:02:04')
+    ... # doctest: +IGNORE_EXCEPTION_DETAIL
+    Traceback (most recent call last):
+      ...
+    ValueError: ...
+    >>> parse_iso_datetime('2013-06-13T10:02:04.')
+    ... # doctest: +IGNORE_EXCEPTION_DETAIL
+    Traceback (most recent call last):
+      ...
+    ValueError: ...
+    >>> parse_iso_datetime(u'2013-06-13T10:02:0\u0664')
+    ... # doctest: +IGNORE_EXCEPTION_DETAIL
+    Traceback (most recent call last):
+      ...
+    ValueError: ...
     """
     if prestrip:
         s = s.strip()
+    dt = _parse_common_iso_datetime(s)
+    if dt is not None:
+        return dt
     match = ISO_DATETIME_REGEX.match(s)
     if match:
         d = _make_date_from_match(match)
@@ -369,6 +423,47 @@ def parse_iso_datetime_to_utc(s, prestrip=True):
     return datetime_utc_normalize(parse_iso_datetime(s, prestrip=prestrip))
 
 
+#: The LRU cache used by :func:`parse_iso_datetime_to_utc_cached`
+#: (its :attr:`~n6sdk.cache_helpers.LRUCache.hits` and
+#: :attr:`~n6sdk.cache_helpers.LRUCache.misses` counters can be read
+#: to check how effective the caching is).
+ISO_DATETIME_TO_UTC_CACHE = LRUCache(maxsize=10000)
+
+
+def parse_iso_datetime_to_utc_cached(s, prestrip=True):
+    """
+    A cached version of :func:`parse_iso_datetime_to_utc`.
+
+    Args/kwargs/returns/raises: the same as for
+    :func:`parse_iso_datetime_to_utc`.
+
+    Results are kept in the :data:`ISO_DATETIME_TO_UTC_CACHE` LRU cache
+    (errors are not cached), so that parsing a string that has recently
+    been parsed costs just a cache lookup.  This is useful, e.g., when
+    many data records share the same timestamps.
+
+    >>> ISO_DATETIME_TO_UTC_CACHE.clear()
+    >>> parse_iso_datetime_to_utc_cached('2013-06-13 10:02+02:00')
+    datetime.datetime(2013, 6, 13, 8, 2)
+    >>> parse_iso_datetime_to_utc_cached('2013-06-13 10:02+02:00')
+    datetime.datetime(2013, 6, 13, 8, 2)
+    >>> ISO_DATETIME_TO_UTC_CACHE.hits, ISO_DATETIME_TO_UTC_CACHE.misses
+    (1, 1)
+    >>> parse_iso_datetime_to_utc_cached('2013-06-13 10:02+02:00 ',
+    ...                                  prestrip=False)
+    ... # doctest: +IGNORE_EXCEPTION_DETAIL
+    Traceback (most recent call last):
+    ...
+    ValueError: ...
+    """
+    cache_key = s, prestrip
+    dt = ISO_DATETIME_TO_UTC_CACHE.get(cache_key)
+    if dt is None:
+        dt = ISO_DATETIME_TO_UTC_CACHE[cache_key] = parse_iso_datetime_to_utc(
+            s, prestrip=prestrip)
+    return dt
+
+
 # TODO: doc, tests
 def parse_python_formatted_datetime(s):
     """
@@ -409,6 +504,55 @@ def is_datetime_format_normalized(s):
     return False
 
 
+# (maps 2-digit strings to their int values: '00' -> 0 ... '99' -> 99)
+_TWO_DIGITS_TO_INT = {'{:02}'.format(i): i for i in xrange(100)}
+
+
+def _parse_common_iso_datetime(
+        s,
+        # [the following constant is placed here as a pseudo-argument
+        # just for efficiency (local variable lookups are faster than
+        # dict-based global/builtin lookups)]
+        _two_digits_to_int=_TWO_DIGITS_TO_INT):
+    # the fast path of parse_iso_datetime(); for the input in the form:
+    # YYYY-MM-DD{T or space}hh:mm:ss[.<fraction of second>][Z] -> a
+    # naive datetime.datetime (the same as the regex-based parser would
+    # return); for any other input -> None (note: None is also returned
+    # for out-of-range values, so that the regex-based parser can deal
+    # with them, producing the result or the appropriate error)
+    if not (len(s) >= 19 and
+            s[4] == '-' and s[7] == '-' and
+            s[10] in 'T ' and
+            s[13] == ':' and s[16] == ':'):
+        return None
+    tail = s[19:]
+    if tail.endswith('Z'):
+        tail = tail[:-1]
+    if not tail:
+        microsecond = 0
+    elif tail[0] == '.':
+        fract_str = tail[1:]
+        if not fract_str or fract_str.strip('0123456789'):
+            # empty or containing something else than ASCII digits
+            return None
+        microsecond = (int(fract_str) * 1000000) // (10 ** len(fract_str))
+    else:
+        return None
+    try:
+        # (dict lookups both validate and convert the digits -- note
+        # that only ASCII digits are accepted, as by the regex)
+        return datetime.datetime(
+            _two_digits_to_int[s[:2]] * 100 + _two_digits_to_int[s[2:4]],
+            _two_digits_to_int[s[5:7]],
+            _two_digits_to_int[s[8:10]],
+            _two_digits_to_int[s[11:13]],
+            _two_digits_to_int[s[14:16]],
+            _two_digits_to_int[s[17:19]],
+            microsecond)
+    except (KeyError, ValueError):
+        return None
+
+
 # TODO: doc, tests
 def _make_date_from_match(match):
     g = match.groupdict()
@@ -14,6 +14,11 @@
 import functools
 import itertools
 import logging
+import Queue
+import sys
+import threading
+import time
+import zlib
 
 from pyramid.config import Configurator
 from pyramid.httpexceptions import (
@@ -54,6 +59,44 @@ LOGGER = logging.getLogger(__name__)
 DUMMY_PERMISSION = "dummy_permission"
 DEFAULT_HTTP_METHODS = ('GET',)
 
+#: The name of the setting (in the *.ini file) that enables compression
+#: of streamed responses: a list of content codings (``gzip`` and/or
+#: ``deflate``), separated with spaces or commas, in the order of
+#: preference; the client's ``Accept-Encoding`` header decides which
+#: of them (if any) is used.  If not specified, responses are not
+#: compressed.
+STREAM_COMPRESSION_SETTING_NAME = 'n6sdk.stream_compression'
+
+#: The name of the setting (in the *.ini file) that can specify the
+#: compression level (0-9; default: 6).
+STREAM_COMPRESSION_LEVEL_SETTING_NAME = 'n6sdk.stream_compression_level'
+
+#: The name of the setting (in the *.ini file) that can specify how
+#: often (in seconds) the compressor is flushed, so that the client
+#: receives what has been compressed so far (if not specified, the
+#: compressor emits output only when its internal buffer is full).
+STREAM_COMPRESSION_FLUSH_INTERVAL_SETTING_NAME = (
+    'n6sdk.stream_compression_flush_interval')
+
+DEFAULT_STREAM_COMPRESSION_LEVEL = 6
+
+#: The name of the setting (in the *.ini file) that enables background
+#: prefetching of result records: the maximum number of records the
+#: data backend API's iterator can get ahead of the renderer (the
+#: iterator is then run in a separate thread -- see:
+#: :func:`iter_prefetched`).  If not specified (or not positive), the
+#: iterator is consumed directly in the thread that renders the
+#: response.  Do not enable it if the data backend API's iterators
+#: rely on thread-local state (such as SQLAlchemy's scoped sessions or
+#: transactions bound to the request's thread).
+STREAM_PREFETCH_QUEUE_SIZE_SETTING_NAME = 'n6sdk.stream_prefetch_queue_size'
+
+# (maps content codings to zlib's `wbits` values)
+_COMPRESSION_WBITS = {
+    'gzip': 16 + zlib.MAX_WBITS,
+    'deflate': zlib.MAX_WBITS,
+}
+
 
 
 #
@@ -93,16 +136,64 @@ class StreamResponse(Response):
             :func:`register_stream_renderer`.
         `request`:
             A Pyramid *request* object.
+
+    Optional constructor kwargs:
+        `data_spec` (default: :obj:`None`):
+            The data specification object of the rendered data (if
+            not :obj:`None`, it is set as the renderer's `data_spec`
+            attribute -- see:
+            :attr:`~.renderers.BaseStreamRenderer.data_spec`).
+        `data_is_jsonable` (default: :obj:`False`):
+            Whether the result dictionaries yielded by
+            `data_generator` have already been made *jsonable* (if
+            true, it is set as the renderer's `data_is_jsonable`
+            attribute; it should be true only if the renderer's
+            `accepts_jsonable_data` attribute is true -- see:
+            :attr:`~.renderers.BaseStreamRenderer.accepts_jsonable_data`).
+
+    If the :data:`STREAM_COMPRESSION_SETTING_NAME` setting is
+    specified, the response is compressed on the fly (with one of
+    the content codings accepted by the client, if any).
     """
 
-    def __init__(self, data_generator, renderer_name, request):
+    def __init__(self, data_generator, renderer_name, request,
+                 data_spec=None, data_is_jsonable=False):
         super(StreamResponse, self).__init__(conditional_response=True)
         renderer_factory = registered_stream_renderers[renderer_name]
         self.stream_renderer = renderer_factory(data_generator, request)
+        if data_spec is not None:
+            self.stream_renderer.data_spec = data_spec
+        if data_is_jsonable:
+            self.stream_renderer.data_is_jsonable = True
         self.content_type = self.stream_renderer.content_type
         app_iter = self.stream_renderer.generate_content()
+        settings = getattr(request.registry, 'settings', None)
+        if isinstance(settings, dict):
+            app_iter = self._compressed_if_enabled(app_iter, request, settings)
         self.app_iter = app_iter
 
+    def _compressed_if_enabled(self, app_iter, request, settings):
+        available = settings.get(STREAM_COMPRESSION_SETTING_NAME)
+        if not available:
+            return app_iter
+        self.vary = ('Accept-Encoding',)
+        content_encoding = choose_content_encoding(
+            available.replace(',', ' ').split(),
+            request.environ.get('HTTP_ACCEPT_ENCODING', ''))
+        if content_encoding is None:
+            return app_iter
+        level = settings.get(STREAM_COMPRESSION_LEVEL_SETTING_NAME)
+        flush_interval = settings.get(
+            STREAM_COMPRESSION_FLUSH_INTERVAL_SETTING_NAME)
+        self.content_encoding = content_encoding
+        return iter_compressed_chunks(
+            app_iter,
+            content_encoding,
+            level=(DEFAULT_STREAM_COMPRESSION_LEVEL if level is None
+                   else int(level)),
+            flush_interval=(None if flush_interval is None
+                            else float(flush_interval)))
+
 
 
 class DefaultStreamViewBase(object):
@@ -120,6 +211,19 @@ class DefaultStreamViewBase(object):
     #: the -- already partially sent -- response).
     break_on_result_cleaning_error = True
 
+    #: This flag can be set to :obj:`True` in a subclass to enable the
+    #: *fused clean-and-render* mode: then, if the stream renderer
+    #: supports it and would benefit from it (see:
+    #: :attr:`~.renderers.BaseStreamRenderer.accepts_jsonable_data`
+    #: and :meth:`~.renderers.BaseStreamRenderer.prefers_jsonable_data`
+    #: -- among the standard renderers, only the ``json`` one with a
+    #: JSON backend other than ``'stdlib'``), result records are
+    #: cleaned directly into the form the renderer encodes (empty
+    #: items omitted, :class:`datetime.datetime` values formatted as
+    #: strings), so that the renderer does not need to make yet
+    #: another copy of each of them.
+    fused_clean_and_render = False
+
     @classmethod
     def concrete_view_class(cls, resource_id, renderers, data_spec,
                             data_backend_api_method, adjust_exc):
@@ -223,7 +327,12 @@ class DefaultStreamViewBase(object):
     def __call__(self):
         self.params = self.prepare_params()
         data_generator = self.call_api()
-        return StreamResponse(data_generator, self.renderer_name, self.request)
+        return StreamResponse(
+            data_generator,
+            self.renderer_name,
+            self.request,
+            data_spec=self.data_spec,
+            data_is_jsonable=self.is_clean_and_render_fused())
 
     def prepare_params(self):
         param_dict = dict(self.iter_deduplicated_params())
@@ -243,14 +352,23 @@ class DefaultStreamViewBase(object):
     def call_api(self):
         api_method_name = self.data_backend_api_method
         api_method = getattr(self.request.registry.data_backend_api, api_method_name)
-        clean_result_dict = self.data_spec.clean_result_dict
         clean_result_dict_kwargs = self.get_clean_result_dict_kwargs()
+        if self.is_clean_and_render_fused():
+            clean_result_dict_kwargs = dict(
+                clean_result_dict_kwargs,
+                value_converter=(standard_stream_renderers.
+                                 jsonable_value_with_nulls_removed))
+        clean_result_dict = self.data_spec.make_result_dict_cleaner(
+            **clean_result_dict_kwargs)
+        prefetch_queue_size = self.get_prefetch_queue_size()
         try:
-            for result_dict in self.call_api_method(api_method):
+            result_dicts = self.call_api_method(api_method)
+            if prefetch_queue_size is not None and prefetch_queue_size > 0:
+                result_dicts = iter_prefetched(result_dicts,
+                                               prefetch_queue_size)
+            for result_dict in result_dicts:
                 try:
-                    yield clean_result_dict(
-                        result_dict,
-                        **clean_result_dict_kwargs)
+                    yield clean_result_dict(result_dict)
                 except ResultCleaningError as exc:
                     if self.break_on_result_cleaning_error:
                         raise
@@ -261,12 +379,46 @@ class DefaultStreamViewBase(object):
         except Exception as exc:
             raise self.adjust_exc(exc)
 
+    def is_clean_and_render_fused(self):
+        if not self.fused_clean_and_render:
+            return False
+        renderer_factory = registered_stream_renderers[self.renderer_name]
+        return bool(
+            getattr(renderer_factory, 'accepts_jsonable_data', False) and
+            renderer_factory.prefers_jsonable_data(self.request))
+
     def call_api_method(self, api_method):
         return api_method(
             self.request.auth_data,
             self.params,
             **self.get_extra_api_kwargs())
 
+    def get_prefetch_queue_size(self):
+        """
+        Get the size of the queue for prefetched result records.
+
+        Returns:
+            The value of the :data:`STREAM_PREFETCH_QUEUE_SIZE_SETTING_NAME`
+            setting (as an :class:`int`) or :obj:`None` if it is not
+            specified or is not positive (then no prefetching is done).
+
+        Can be overridden in subclasses, e.g., to return :obj:`None`
+        for data backend API methods that are not safe to be iterated
+        over in another thread (e.g., ones that use a SQLAlchemy
+        *scoped session* or a transaction bound to the request's
+        thread -- see: :func:`iter_prefetched`).
+        """
+        settings = getattr(self.request.registry, 'settings', None)
+        if not isinstance(settings, dict):
+            return None
+        queue_size = settings.get(STREAM_PREFETCH_QUEUE_SIZE_SETTING_NAME)
+        if queue_size is None:
+            return None
+        queue_size = int(queue_size)
+        if queue_size <= 0:
+            return None
+        return queue_size
+
     def get_clean_param_dict_kwargs(self):
         return {}
 
@@ -533,6 +685,231 @@ class ConfigHelper(object):
 
 
 
+#
+# Streamed response compression
+
+def choose_content_encoding(available, accept_encoding):
+    """
+    Choose the content coding to be used to compress a response.
+
+    Args:
+        `available` (sequence of :class:`str`):
+            Content codings supported by the server (``'gzip'``
+            and/or ``'deflate'``), in the order of preference.
+        `accept_encoding` (:class:`str`):
+            The value of the client's ``Accept-Encoding`` header.
+
+    Returns:
+        The chosen content coding (one with the highest *qvalue*;
+        for equal *qvalues* -- the first one in `available`) or
+        :obj:`None` if none of `available` is acceptable.
+
+    >>> choose_content_encoding(['gzip', 'deflate'], 'gzip, deflate')
+    'gzip'
+    >>> choose_content_encoding(['gzip', 'deflate'], 'gzip;q=0.5, deflate')
+    'deflate'
+    >>> choose_content_encoding(['gzip', 'deflate'], 'deflate, *;q=0.1')
+    'deflate'
+    >>> choose_content_encoding(['gzip', 'deflate'], 'GZIP;Q=0.2, *;q=0.1')
+    'gzip'
+    >>> choose_content_encoding(['gzip', 'deflate'], '*')
+    'gzip'
+    >>> choose_content_encoding(['deflate'], 'gzip') is None
+    True
+    >>> choose_content_encoding(['gzip'], 'identity, gzip;q=0') is None
+    True
+    >>> choose_content_encoding(['gzip'], '') is None
+    True
+    """
+    qvalues = {}
+    for item in accept_encoding.split(','):
+        coding, _, params = item.partition(';')
+        coding = coding.strip().lower()
+        if not coding:
+            continue
+        qvalue = 1.0
+        for param in params.split(';'):
+            name, _, value = param.partition('=')
+            if name.strip().lower() == 'q':
+                try:
+                    qvalue = float(value)
+                except ValueError:
+                    qvalue = 0.0
+        qvalues[coding] = qvalue
+    best_coding = None
+    best_qvalue = 0.0
+    for coding in available:
+        qvalue = qvalues.get(coding, qvalues.get('*', 0.0))
+        if qvalue > best_qvalue:
+            best_coding = coding
+            best_qvalue = qvalue
+    return best_coding
+
+
+def iter_compressed_chunks(chunks, content_encoding,
+                           level=DEFAULT_STREAM_COMPRESSION_LEVEL,
+                           flush_interval=None,
+                           _time=time.time):
+    """
+    Compress the given chunks incrementally.
+
+    Args:
+        `chunks` (iterable of :class:`str`):
+            Consecutive chunks of response content.
+        `content_encoding` (:class:`str`):
+            ``'gzip'`` or ``'deflate'`` (the latter, as HTTP requires,
+            means the *zlib* format).
+
+    Kwargs:
+        `level` (:class:`int`; default: 6):
+            The compression level (0-9).
+        `flush_interval` (:class:`float` or :obj:`None`; default: :obj:`None`):
+            If not :obj:`None`: the compressor is flushed (so that
+            the compressed data are complete up to the current
+            input chunk) if this number of seconds has elapsed since
+            the previous flush (checked after each input chunk; 0
+            means: flush after every chunk).
+
+    Yields:
+        Non-empty :class:`str` chunks of compressed content.
+
+    >>> chunks = ['abc' * 1000, 'def' * 1000, '', 'ghi']
+    >>> compressed = ''.join(iter_compressed_chunks(chunks, 'gzip'))
+    >>> zlib.decompress(compressed, 16 + zlib.MAX_WBITS) == ''.join(chunks)
+    True
+
+    >>> compressed = list(iter_compressed_chunks(chunks, 'deflate',
+    ...                                          flush_interval=0))
+    >>> len(compressed)  # (one for each non-empty chunk + the final one)
+    4
+    >>> decompressor = zlib.decompressobj()
+    >>> [decompressor.decompress(c) for c in compressed] == [
+    ...     'abc' * 1000, 'def' * 1000, 'ghi', '']
+    True
+    """
+    compressobj = zlib.compressobj(
+        level,
+        zlib.DEFLATED,
+        _COMPRESSION_WBITS[content_encoding])
+    compress = compressobj.compress
+    flush = compressobj.flush
+    if flush_interval is not None:
+        deadline = _time() + flush_interval
+    for chunk in chunks:
+        if not chunk:
+            continue
+        compressed = compress(chunk)
+        if flush_interval is not None and _time() >= deadline:
+            compressed += flush(zlib.Z_SYNC_FLUSH)
+            deadline = _time() + flush_interval
+        if compressed:
+            yield compressed
+    yield flush()
+
+
+def iter_prefetched(iterable, queue_size,
+                    _poll_interval=0.1):
+    """
+    Iterate over the given iterable in a separate (worker) thread.
+
+    Args:
+        `iterable`:
+            Any iterable (typically, a generator returned by a data
+            backend API method).
+        `queue_size` (:class:`int`):
+            The maximum number of items the worker thread can get ahead
+            of the consumer (when the queue is full, the worker thread
+            waits -- so that memory usage remains bounded); must be
+            positive.
+
+    Yields:
+        Consecutive items of the given iterable.
+
+    Raises:
+        :exc:`~exceptions.ValueError` if `queue_size` is not positive
+        (when the returned generator is started).
+
+    Any exception raised by the iterable is re-raised in the consumer's
+    thread (with the original traceback).  When the generator returned
+    by this function is closed (or garbage-collected) before the end of
+    the iterable, the worker thread stops and -- if the iterable's
+    iterator has the `close()` method (as generators do) -- closes it.
+
+    .. warning::
+
+       The iterable is iterated over (and closed) in the worker thread,
+       so it must not depend on thread-local state of the consumer's
+       thread -- e.g., on a SQLAlchemy *scoped session* (which is
+       thread-local) or on a transaction bound to the request's thread
+       (such as one managed by *pyramid_tm*/*zope.sqlalchemy*).
+
+    >>> list(iter_prefetched(iter(xrange(5)), 2))
+    [0, 1, 2, 3, 4]
+    >>> def gen():
+    ...     yield 1
+    ...     raise ValueError('backend error')
+    ...
+    >>> prefetched = iter_prefetched(gen(), 10)
+    >>> next(prefetched)
+    1
+    >>> next(prefetched)
+    Traceback (most recent call last):
+      ...
+    ValueError: backend error
+    >>> next(iter_prefetched(iter(xrange(5)), 0))
+    Traceback (most recent call last):
+      ...
+    ValueError: queue_size must be positive (got 0)
+    """
+    if queue_size <= 0:
+        # (Queue.Queue would be unbounded)
+        raise ValueError('queue_size must be positive (got {!r})'
+                         .format(queue_size))
+    queue = Queue.Queue(queue_size)
+    stopped = threading.Event()
+
+    def put(item):
+        while not stopped.is_set():
+            try:
+                queue.put(item, timeout=_poll_interval)
+            except Queue.Full:
+                continue
+            return True
+        return False
+
+    def work():
+        iterator = None
+        try:
+            iterator = iter(iterable)
+            for item in iterator:
+                if not put((True, item)):
+                    return
+        except BaseException:
+            put((False, sys.exc_info()))
+        else:
+            put((False, None))
+        finally:
+            close = getattr(iterator, 'close', None)
+            if close is not None:
+                close()
+
+    worker = threading.Thread(target=work, name='n6sdk-prefetch')
+    worker.daemon = True
+    worker.start()
+    try:
+        while True:
+            is_item, value = queue.get()
+            if is_item:
+                yield value
+            elif value is None:
+                return
+            else:
+                raise value[0], value[1], value[2]
+    finally:
+        stopped.set()
+
+
+
 #
 # Stream renderer registration
 
@@ -598,6 +975,16 @@ def register_stream_renderer(name, renderer_factory=None, allow_replace=False):
 
 register_stream_renderer('json', standard_stream_renderers.StreamRenderer_json)
 register_stream_renderer('sjson', standard_stream_renderers.StreamRenderer_sjson)
+register_stream_renderer('json_compact',
+                         standard_stream_renderers.StreamRenderer_json_compact)
+register_stream_renderer('csv', standard_stream_renderers.StreamRenderer_csv)
+register_stream_renderer('tsv', standard_stream_renderers.StreamRenderer_tsv)
+if standard_stream_renderers.msgpack is not None:
+    register_stream_renderer('msgpack',
+                             standard_stream_renderers.StreamRenderer_msgpack)
+if standard_stream_renderers.pyarrow is not None:
+    register_stream_renderer('arrow',
+                             standard_stream_renderers.StreamRenderer_arrow)
 
 
 
@@ -16,8 +16,49 @@
 """
 
 
+import csv
+import functools
+import io
 import json
 import datetime
+import logging
+import time
+import weakref
+
+try:
+    import msgpack
+    msgpack.Timestamp  # (requires msgpack >= 1.0)
+except (ImportError, AttributeError):
+    msgpack = None
+
+try:
+    import pyarrow
+except ImportError:
+    pyarrow = None
+
+from n6sdk.data_spec.fields import (
+    DateTimeField,
+    DictResultField,
+    IntegerField,
+    ResultListFieldMixin,
+    UnicodeEnumField,
+    UnicodeField,
+)
+
+
+LOGGER = logging.getLogger(__name__)
+
+
+#: The name of the setting (in the *.ini file) that can specify the
+#: target size (in bytes) of chunks yielded by the stream renderers'
+#: :meth:`~BaseStreamRenderer.generate_content` (see:
+#: :attr:`BaseStreamRenderer.chunk_size`).
+CHUNK_SIZE_SETTING_NAME = 'n6sdk.stream_chunk_size'
+
+#: The name of the setting (in the *.ini file) that can specify the
+#: flush-on-idle interval (in seconds) of the stream renderers (see:
+#: :attr:`BaseStreamRenderer.flush_interval`).
+FLUSH_INTERVAL_SETTING_NAME = 'n6sdk.stream_flush_interval'
 
 
 class BaseStreamRenderer(object):
@@ -28,6 +69,66 @@ class BaseStreamRenderer(object):
 
     content_type = None
 
+    #: The target size (in bytes) of chunks yielded by
+    #: :meth:`generate_content` (rendered pieces of content are joined
+    #: into such chunks to reduce per-write overhead of the WSGI
+    #: server); :obj:`None` or 0 (the default) means: no coalescing
+    #: (every piece is yielded separately).  Can be overridden with the
+    #: :data:`CHUNK_SIZE_SETTING_NAME` setting.
+    #:
+    #: .. note::
+    #:
+    #:    Buffered content is yielded only when a next piece of content
+    #:    is rendered, so if data items come slowly, it may be worth to
+    #:    set also :attr:`flush_interval`.
+    chunk_size = None
+
+    #: If not :obj:`None`: the maximum time (in seconds) rendered
+    #: content is kept buffered when data items come slowly (checked
+    #: whenever a new piece of content is rendered).  Can be overridden
+    #: with the :data:`FLUSH_INTERVAL_SETTING_NAME` setting.
+    flush_interval = None
+
+    #: The data specification (an instance of a
+    #: :class:`n6sdk.data_spec.BaseDataSpec` subclass) of the rendered
+    #: data -- set by :class:`n6sdk.pyramid_commons.StreamResponse`
+    #: (if it is known) just after the renderer is created.
+    data_spec = None
+
+    #: Whether the renderer can render result dictionaries that have
+    #: already been made *jsonable* during cleaning, i.e., ones with
+    #: empty items omitted and with :class:`datetime.datetime` values
+    #: converted to strings (see:
+    #: :func:`jsonable_value_with_nulls_removed`, the
+    #: :meth:`prefers_jsonable_data` method and the
+    #: `fused_clean_and_render` flag of
+    #: :class:`n6sdk.pyramid_commons.DefaultStreamViewBase`).
+    accepts_jsonable_data = False
+
+    #: Whether the rendered result dictionaries are *jsonable* (see
+    #: above) -- set by :class:`n6sdk.pyramid_commons.StreamResponse`
+    #: just after the renderer is created (only if
+    #: :attr:`accepts_jsonable_data` is true).
+    data_is_jsonable = False
+
+    @classmethod
+    def prefers_jsonable_data(cls, request):
+        """
+        Whether it is worth to make result dictionaries *jsonable*
+        (see: :attr:`accepts_jsonable_data`) already during cleaning
+        -- for the given request.
+
+        It is so only if, otherwise, the renderer would need to make
+        a *jsonable* copy of each result dictionary anyway (making
+        data *jsonable* during cleaning is *not* free: for renderers
+        that encode data in one pass, such as the data-spec-aware
+        JSON encoder -- see: :meth:`get_json_encoder` -- or the CSV
+        renderer, it is just an overhead).
+
+        The default implementation returns :obj:`False`.
+        """
+        return False
+
     def __init__(self, data_generator, request):
         if self.content_type is None:
             raise NotImplementedError(
@@ -35,6 +136,13 @@ class BaseStreamRenderer(object):
         self.data_generator = data_generator
         self.request = request
         self.is_first = True
+        settings = _get_settings(request)
+        chunk_size = settings.get(CHUNK_SIZE_SETTING_NAME)
+        if chunk_size is not None:
+            self.chunk_size = int(chunk_size)
+        flush_interval = settings.get(FLUSH_INTERVAL_SETTING_NAME)
+        if flush_interval is not None:
+            self.flush_interval = float(flush_interval)
 
     def before_content(self, **kwargs):
         return ""
@@ -51,13 +159,54 @@ class BaseStreamRenderer(object):
             yield self.render_content(data)
             self.is_first = False
 
-    def generate_content(self, **kwargs):
+    def iter_all_content(self, **kwargs):
         yield self.before_content()
         for content in self.iter_content():
             yield content
         yield self.after_content()
         self.is_first = True
 
+    def generate_content(self, **kwargs):
+        return iter_coalesced_chunks(
+            self.iter_all_content(),
+            self.chunk_size,
+            self.flush_interval)
+
+    def get_json_encoder(self, json_backend=None, separators=None):
+        """
+        Get a function that takes a result dictionary and returns its
+        (non-indented) JSON representation, with empty items removed.
+
+        Args/kwargs:
+            `json_backend` (default: :obj:`None`):
+                The name of the JSON backend (see:
+                :func:`data_dict_to_json`).
+            `separators` (default: :obj:`None`):
+                If not :obj:`None`, an ``(item_separator,
+                key_separator)`` tuple (as for :func:`json.dumps`).
+
+        Returns:
+            The data-spec-aware encoder (see:
+            :func:`get_data_spec_json_encoder`) -- if :attr:`data_spec`
+            is known and the JSON backend to be used is ``'stdlib'``
+            (for which that encoder is the fastest; also if
+            :attr:`data_is_jsonable` is true); otherwise, if
+            :attr:`data_is_jsonable` is true -- a function that passes
+            the dictionary directly to the JSON backend (no copy is
+            made); otherwise -- a :func:`data_dict_to_json` wrapper.
+        """
+        if (self.data_spec is not None and
+              (json_backend or default_json_backend_name) == 'stdlib'):
+            return get_data_spec_json_encoder(
+                self.data_spec,
+                separators or _DEFAULT_JSON_SEPARATORS)
+        if self.data_is_jsonable:
+            return _make_jsonable_dict_json_encoder(json_backend, separators)
+        kwargs = {} if separators is None else {'separators': separators}
+        return functools.partial(data_dict_to_json,
+                                 json_backend=json_backend,
+                                 **kwargs)
+
 
 class StreamRenderer_sjson(BaseStreamRenderer):
 
@@ -66,9 +215,28 @@ class StreamRenderer_sjson(BaseStreamRenderer):
     """
 
     content_type = "text/plain"
+    accepts_jsonable_data = True
+
+    @classmethod
+    def prefers_jsonable_data(cls, request):
+        # (for the 'stdlib' backend the data-spec-aware encoder is
+        # used, so *jsonable* data would not help)
+        json_backend = get_json_backend_name_from_settings(request)
+        return (json_backend or default_json_backend_name) != 'stdlib'
+
+    def __init__(self, data_generator, request):
+        super(StreamRenderer_sjson, self).__init__(data_generator, request)
+        self.json_backend = get_json_backend_name_from_settings(request)
+        self.encode_json = functools.partial(data_dict_to_json,
+                                             json_backend=self.json_backend)
+
+    def before_content(self, **kwargs):
+        # (now `data_spec` is already set, if known)
+        self.encode_json = self.get_json_encoder(self.json_backend)
+        return ""
 
     def render_content(self, data, **kwargs):
-        jsonized = data_dict_to_json(data)
+        jsonized = self.encode_json(data)
         return jsonized + "\n"
 
     def after_content(self, **kwargs):
@@ -82,6 +250,7 @@ class StreamRenderer_json(BaseStreamRenderer):
     """
 
     content_type = "application/json"
+    accepts_jsonable_data = True
 
     def before_content(self, **kwargs):
         return "[\n"
@@ -97,18 +266,480 @@ class StreamRenderer_json(BaseStreamRenderer):
             return ",\n" + jsonized
 
 
+class StreamRenderer_json_compact(StreamRenderer_json):
+
+    """
+    The class of the renderer registered as the ``json_compact`` one.
+
+    It produces the same JSON array as :class:`StreamRenderer_json`
+    but with no indentation and with minimal separators (one array
+    item per line).
+    """
+
+    separators = (',', ':')
+
+    def __init__(self, data_generator, request):
+        super(StreamRenderer_json_compact, self).__init__(data_generator,
+                                                          request)
+        self.encode_json = functools.partial(data_dict_to_json,
+                                             separators=self.separators)
+
+    def before_content(self, **kwargs):
+        # (now `data_spec` is already set, if known)
+        self.encode_json = self.get_json_encoder(separators=self.separators)
+        return super(StreamRenderer_json_compact, self).before_content(
+            **kwargs)
+
+    def render_content(self, data, **kwargs):
+        jsonized = self.encode_json(data)
+        if self.is_first:
+            return jsonized
+        else:
+            return ",\n" + jsonized
+
+
+class StreamRenderer_msgpack(BaseStreamRenderer):
+
+    """
+    The class of the renderer registered as the ``msgpack`` one (only
+    if the *msgpack* library, version 1.0 or newer, is installed).
+
+    It produces a stream of consecutive MessagePack maps (one per
+    result dictionary; empty items removed -- as
+    :func:`dict_with_nulls_removed` does); :class:`datetime.datetime`
+    values (which are expected to be "naive" UTC ones) are packed as
+    the MessagePack *timestamp* extension type.
+    """
+
+    content_type = "application/x-msgpack"
+
+    def __init__(self, data_generator, request):
+        if msgpack is None:
+            raise RuntimeError('the msgpack library is not installed')
+        super(StreamRenderer_msgpack, self).__init__(data_generator, request)
+        self._pack = msgpack.Packer(
+            default=_msgpack_default,
+            use_bin_type=False).pack
+
+    def render_content(self, data, **kwargs):
+        return self._pack(dict_with_nulls_removed(data))
+
+
+class StreamRenderer_csv(BaseStreamRenderer):
+
+    """
+    The class of the renderer registered as the ``csv`` one.
+
+    The first row contains column names: the result keys of the data
+    specification (see: :attr:`BaseStreamRenderer.data_spec` and
+    :meth:`n6sdk.data_spec.BaseDataSpec.result_field_specs`) -- those
+    listed in :attr:`leading_columns` first, then the rest in
+    alphabetical order; the ``address`` key is replaced with columns
+    for the keys of ``address`` items (see: :meth:`get_address_columns`;
+    values from consecutive ``address`` items are separated with
+    spaces; if an item lacks some key,
+    :attr:`missing_address_value` is put in its place, so that the
+    n-th words of all address columns always refer to the n-th
+    ``address`` item).  If the data specification is not known, the
+    one of :class:`n6sdk.data_spec.DataSpec` is used.
+
+    Strings are UTF-8-encoded, :class:`datetime.datetime` values are
+    formatted as in JSON output, lists of simple values are joined
+    with spaces and other containers are rendered as JSON.
+    """
+
+    content_type = "text/csv"
+    accepts_jsonable_data = True
+    csv_dialect = 'excel'
+
+    leading_columns = ('time', 'id', 'source', 'category', 'name')
+    address_columns = ('ip', 'ipv6', 'asn', 'cc', 'dir', 'rdns')
+    missing_address_value = '-'
+
+    def __init__(self, data_generator, request):
+        super(StreamRenderer_csv, self).__init__(data_generator, request)
+        self._chunk_buffer = _ChunkBuffer()
+        self._writerow = csv.writer(
+            self._chunk_buffer,
+            dialect=self.csv_dialect).writerow
+        self._columns = None
+        self._address_columns = frozenset()
+
+    def get_columns(self):
+        data_spec = _data_spec_or_default(self.data_spec)
+        field_specs = data_spec.result_field_specs()
+        columns = []
+        for key in _ordered_result_keys(field_specs, self.leading_columns):
+            if key == 'address':
+                columns.extend(self.get_address_columns(field_specs[key]))
+            else:
+                columns.append(key)
+        return columns
+
+    def get_address_columns(self, address_field):
+        """
+        Get the column names for the keys of ``address`` items.
+
+        If the given field specifies its subfields (as
+        :class:`~n6sdk.data_spec.fields.AddressField` and
+        :class:`~n6sdk.data_spec.fields.ExtendedAddressField` do), the
+        columns are their keys -- those listed in
+        :attr:`address_columns` first, then the rest in alphabetical
+        order; otherwise, the columns are just :attr:`address_columns`.
+        """
+        key_to_subfield = getattr(address_field, 'key_to_subfield', None)
+        if key_to_subfield is None:
+            return list(self.address_columns)
+        return _ordered_result_keys(key_to_subfield, self.address_columns)
+
+    def before_content(self, **kwargs):
+        self._columns = self.get_columns()
+        data_spec = _data_spec_or_default(self.data_spec)
+        field_specs = data_spec.result_field_specs()
+        self._address_columns = (
+            frozenset(self.get_address_columns(field_specs['address']))
+            if 'address' in field_specs
+            else frozenset())
+        self._writerow(self._columns)
+        return self._chunk_buffer.pop_content()
+
+    def render_content(self, data, **kwargs):
+        address_columns = self._address_columns
+        missing = self.missing_address_value
+        addresses = data.get('address') or ()
+        self._writerow([
+            (_csv_cell([addr.get(key, missing) for addr in addresses])
+             if key in address_columns
+             else _csv_cell(data.get(key)))
+            for key in self._columns])
+        return self._chunk_buffer.pop_content()
+
+
+class StreamRenderer_tsv(StreamRenderer_csv):
+
+    """
+    The class of the renderer registered as the ``tsv`` one.
+
+    The same as :class:`StreamRenderer_csv` but with columns separated
+    with tabs.
+    """
+
+    content_type = "text/tab-separated-values"
+    csv_dialect = 'excel-tab'
+
+
+class StreamRenderer_arrow(BaseStreamRenderer):
+
+    """
+    The class of the renderer registered as the ``arrow`` one (only if
+    the *pyarrow* library is installed).
+
+    It produces an Apache Arrow IPC stream.  Result dictionaries are
+    gathered into record batches of :attr:`batch_size` rows.  Columns
+    are the result keys of the data specification (see:
+    :attr:`BaseStreamRenderer.data_spec`; ordered as in
+    :class:`StreamRenderer_csv`); their types are determined by the
+    types of the corresponding fields:
+
+    * :class:`~n6sdk.data_spec.fields.DateTimeField` -> ``timestamp[us]``,
+    * :class:`~n6sdk.data_spec.fields.IntegerField` -> ``int64``,
+    * :class:`~n6sdk.data_spec.fields.UnicodeEnumField` -> dictionary
+      (with the field's :attr:`enum_values` as the dictionary),
+    * :class:`~n6sdk.data_spec.fields.DictResultField` with
+      :attr:`key_to_subfield_factory` specified -> ``struct`` (whose
+      children's types are determined in the same way),
+    * :class:`~n6sdk.data_spec.fields.DictResultField` without it ->
+      ``string`` (JSON),
+    * other fields -> ``string``;
+
+    for :class:`~n6sdk.data_spec.fields.ResultListFieldMixin`-based
+    fields -- ``list`` of such types.
+    """
+
+    content_type = "application/vnd.apache.arrow.stream"
+
+    batch_size = 65536
+    leading_columns = StreamRenderer_csv.leading_columns
+
+    def __init__(self, data_generator, request):
+        if pyarrow is None:
+            raise RuntimeError('the pyarrow library is not installed')
+        super(StreamRenderer_arrow, self).__init__(data_generator, request)
+        self._rows = []
+        self._sink = io.BytesIO()
+        self._columns = self._schema = self._writer = None
+
+    def get_columns(self):
+        """
+        Get a list of (<key>, <Arrow type>, <converter>) tuples, where
+        <converter> is a function that takes a list of result values
+        (of the respective field) and returns an Arrow array.
+        """
+        data_spec = _data_spec_or_default(self.data_spec)
+        field_specs = data_spec.result_field_specs()
+        return [
+            (key,) + _arrow_type_and_converter(field_specs[key])
+            for key in _ordered_result_keys(field_specs,
+                                            self.leading_columns)]
+
+    def before_content(self, **kwargs):
+        self._columns = self.get_columns()
+        self._schema = pyarrow.schema([
+            (key, arrow_type)
+            for key, arrow_type, _ in self._columns])
+        self._writer = pyarrow.RecordBatchStreamWriter(self._sink,
+                                                       self._schema)
+        return self._pop_output()
+
+    def render_content(self, data, **kwargs):
+        rows = self._rows
+        rows.append(data)
+        if len(rows) >= self.batch_size:
+            self._write_batch()
+            return self._pop_output()
+        return ""
+
+    def after_content(self, **kwargs):
+        if self._rows:
+            self._write_batch()
+        self._writer.close()
+        return self._pop_output()
+
+    def _write_batch(self):
+        rows = self._rows
+        arrays = [convert([row.get(key) for row in rows])
+                  for key, _, convert in self._columns]
+        self._writer.write_batch(
+            pyarrow.RecordBatch.from_arrays(arrays, schema=self._schema))
+        del rows[:]
+
+    def _pop_output(self):
+        sink = self._sink
+        output = sink.getvalue()
+        sink.seek(0)
+        sink.truncate()
+        return output
+
+
 #
 # Helper functions
 
+def _data_spec_or_default(data_spec):
+    if data_spec is None:
+        from n6sdk.data_spec import DataSpec
+        data_spec = DataSpec()
+    return data_spec
+
+
+def _ordered_result_keys(field_specs, leading_keys):
+    keys = field_specs.viewkeys()
+    ordered = [key for key in leading_keys if key in keys]
+    ordered.extend(sorted(keys - set(ordered)))
+    return ordered
+
+
+def _arrow_value_type(field):
+    # (for single values, i.e., ignoring ResultListFieldMixin)
+    if isinstance(field, DateTimeField):
+        return pyarrow.timestamp('us')
+    if isinstance(field, IntegerField):
+        return pyarrow.int64()
+    if (isinstance(field, DictResultField) and
+          field.key_to_subfield is not None):
+        return pyarrow.struct([
+            (key, _arrow_value_type(subfield))
+            for key, subfield in sorted(field.key_to_subfield.iteritems())])
+    return pyarrow.string()
+
+
+def _arrow_type_and_converter(field):
+    if isinstance(field, DictResultField) and field.key_to_subfield is None:
+        arrow_type = pyarrow.string()
+        def convert(values):
+            return pyarrow.array(
+                [(None if v is None
+                  else json.dumps(jsonable_value_with_nulls_removed(v)))
+                 for v in values],
+                type=arrow_type)
+    elif (isinstance(field, UnicodeEnumField) and
+            not isinstance(field, ResultListFieldMixin)):
+        arrow_type = pyarrow.dictionary(pyarrow.int32(), pyarrow.string())
+        dictionary = pyarrow.array(field.enum_values, type=pyarrow.string())
+        get_index = {v: i for i, v in enumerate(field.enum_values)}.get
+        def convert(values):
+            return pyarrow.DictionaryArray.from_arrays(
+                pyarrow.array(map(get_index, values), type=pyarrow.int32()),
+                dictionary)
+    else:
+        arrow_type = _arrow_value_type(field)
+        if isinstance(field, ResultListFieldMixin):
+            arrow_type = pyarrow.list_(arrow_type)
+        def convert(values):
+            return pyarrow.array(values, type=arrow_type)
+    return arrow_type, convert
+
+
+class _ChunkBuffer(list):
+
+    # a file-like object (to be written to by a `csv.writer`)
+    # whose content can be taken in one piece
+
+    write = list.append
+
+    def pop_content(self):
+        content = ''.join(self)
+        del self[:]
+        return content
+
+
+def _csv_cell(value):
+    """
+    >>> _csv_cell(None)
+    ''
+    >>> _csv_cell(u'za\u017c\xf3\u0142\u0107')
+    'za\\xc5\\xbc\\xc3\\xb3\\xc5\\x82\\xc4\\x87'
+    >>> _csv_cell(42)
+    '42'
+    >>> _csv_cell(datetime.datetime(2016, 3, 15, 10, 11, 12))
+    '2016-03-15T10:11:12Z'
+    >>> _csv_cell([u'1.2.3.4', 42, u''])
+    '1.2.3.4 42 '
+    >>> _csv_cell([{u'a': u'b', u'c': None}])
+    '[{"a": "b"}]'
+    """
+    if value is None:
+        return ''
+    if isinstance(value, unicode):
+        return value.encode('utf-8')
+    if isinstance(value, str):
+        return value
+    if isinstance(value, datetime.datetime):
+        return _datetime_to_json_str(value)
+    if isinstance(value, (list, tuple)) and not any(
+            isinstance(v, (dict, list, tuple)) for v in value):
+        return ' '.join(map(_csv_cell, value))
+    if isinstance(value, (dict, list, tuple)):
+        return json.dumps(jsonable_value_with_nulls_removed(value))
+    return str(value)
+
+
+def _get_settings(request):
+    settings = getattr(getattr(request, 'registry', None), 'settings', None)
+    return settings if isinstance(settings, dict) else {}
+
+
+def iter_coalesced_chunks(pieces, chunk_size, flush_interval=None,
+                          _time=time.time):
+    """
+    Join the given pieces of content into chunks of (at least) the
+    specified size.
+
+    Args:
+        `pieces` (iterable of :class:`str`):
+            Pieces of content.
+        `chunk_size` (:class:`int` or :obj:`None`):
+            The target chunk size (in bytes); a chunk is yielded as
+            soon as its size reaches (or exceeds) this value.  If
+            :obj:`None` or 0, non-empty pieces are yielded as they are.
+        `flush_interval` (:class:`float` or :obj:`None`; default: :obj:`None`):
+            If not :obj:`None`: the buffered content is also yielded
+            (as a smaller chunk) if, when a next piece comes, this
+            number of seconds has elapsed since the previous chunk was
+            yielded.
+
+    Yields:
+        Non-empty :class:`str` chunks.  The last one may be smaller
+        than `chunk_size`.
+
+    >>> list(iter_coalesced_chunks(['ab', '', 'cd', 'efg', 'h', 'i'], 4))
+    ['abcd', 'efgh', 'i']
+    >>> list(iter_coalesced_chunks(['ab', '', 'cd', 'efg'], None))
+    ['ab', 'cd', 'efg']
+    >>> list(iter_coalesced_chunks(['ab', 'cd', 'efg'], 100))
+    ['abcdefg']
+    >>> list(iter_coalesced_chunks([], 100))
+    []
+
+    >>> fake_times = iter([0, 0.5, 1.5, 2.0, 2.2, 2.5, 2.9])
+    >>> list(iter_coalesced_chunks(['a', 'b', 'c', 'd', 'e'], 100,
+    ...                            flush_interval=1,
+    ...                            _time=lambda: next(fake_times)))
+    ['ab', 'cde']
+    """
+    if not chunk_size:
+        for piece in pieces:
+            if piece:
+                yield piece
+        return
+    buf = []
+    buf_append = buf.append
+    size = 0
+    if flush_interval is None:
+        for piece in pieces:
+            buf_append(piece)
+            size += len(piece)
+            if size >= chunk_size:
+                yield ''.join(buf)
+                del buf[:]
+                size = 0
+    else:
+        deadline = _time() + flush_interval
+        for piece in pieces:
+            buf_append(piece)
+            size += len(piece)
+            if size >= chunk_size or _time() >= deadline:
+                chunk = ''.join(buf)
+                del buf[:]
+                size = 0
+                if chunk:
+                    yield chunk
+                deadline = _time() + flush_interval
+    if buf:
+        chunk = ''.join(buf)
+        if chunk:
+            yield chunk
+
+
 def _json_default(o):
     if isinstance(o, datetime.datetime):
         return o.isoformat() + "Z"
     raise TypeError(repr(o) + " is not JSON serializable")
 
 
+_UNIX_EPOCH = datetime.datetime(1970, 1, 1)
+
+
+def _msgpack_default(o):
+    if isinstance(o, datetime.datetime):
+        delta = o - _UNIX_EPOCH
+        return msgpack.Timestamp(delta.days * 86400 + delta.seconds,
+                                 delta.microseconds * 1000)
+    raise TypeError(repr(o) + " is not MessagePack serializable")
+
+
+def _datetime_to_json_str(dt):
+    # (the format used in JSON output -- see: _json_default())
+    return dt.isoformat() + "Z"
+
+
+def _jsonable_scalar_or_none(
+        v,
+        # [the following constants are placed here as pseudo-arguments
+        # just for efficiency (local variable lookups are faster than
+        # dict-based global/builtin lookups)]
+        _datetime=datetime.datetime,
+        _datetime_to_json_str=_datetime_to_json_str):
+    # a `value_converter` for dict_with_nulls_removed() (see below)
+    # that converts datetime.datetime instances to strings
+    if v.__class__ is _datetime:
+        return _datetime_to_json_str(v)
+    return v if (v or v == 0) else None
+
+
 # helper for dict_with_nulls_removed() (see below)
 def _container_with_nulls_removed(
         obj,
+        value_converter=None,
         # [the following constants are placed here as pseudo-arguments
         # just for efficiency (local variable lookups are faster than
         # dict-based global/builtin lookups) -- profiling proved that
@@ -121,16 +752,20 @@ def _container_with_nulls_removed(
     this_func = _container_with_nulls_removed
     if _isinstance(obj, _dict):
         items = [
-            (k, (this_func(v)
+            (k, (this_func(v, value_converter)
                  if _isinstance(v, _jsonable_container)
-                 else (v if (v or v == 0) else None)))
+                 else ((v if (v or v == 0) else None)
+                       if value_converter is None
+                       else value_converter(v))))
             for k, v in _dict_items(obj)]
         obj = {k: v for k, v in items if v is not None}
     else:
         #assert _isinstance(obj, (list, tuple))
-        items = [(this_func(v)
+        items = [(this_func(v, value_converter)
                   if _isinstance(v, _jsonable_container)
-                  else (v if (v or v == 0) else None))
+                  else ((v if (v or v == 0) else None)
+                        if value_converter is None
+                        else value_converter(v)))
                  for v in obj]
         obj = [v for v in items if v is not None]
     if obj:
@@ -140,6 +775,7 @@ def _container_with_nulls_removed(
 
 def dict_with_nulls_removed(
         d,
+        value_converter=None,
         # [the following constants are placed here as pseudo-arguments
         # just for efficiency (local variable lookups are faster than
         # dict-based global/builtin lookups) -- profiling proved that
@@ -188,22 +824,674 @@ def dict_with_nulls_removed(
 
     >>> dict_with_nulls_removed({})
     {}
+
+    If `value_converter` is given, it is called (instead of the
+    default empty-or-:obj:`None` check) for each value that is not a
+    container (:class:`dict`, :class:`list` or :class:`tuple`); it
+    should return the value to be placed in the resultant dictionary
+    (or container) or :obj:`None` -- to omit the value.
+
+    >>> dict_with_nulls_removed({'a': 1, 'b': [2, 3, {'c': 4}], 'd': 3},
+    ...                         lambda v: None if v == 3 else v * 10) == {
+    ...  'a': 10, 'b': [20, {'c': 40}],
+    ... }
+    True
     """
     #assert _isinstance(d, dict)
     items = [
-        (k, (_container_with_nulls_removed(v)
+        (k, (_container_with_nulls_removed(v, value_converter)
              if _isinstance(v, _jsonable_container)
-             else (v if (v or v == 0) else None)))
+             else ((v if (v or v == 0) else None)
+                   if value_converter is None
+                   else value_converter(v))))
         for k, v in _dict_items(d)]
     return {k: v for k, v in items if v is not None}
 
 
-def data_dict_to_json(data, **kwargs):
+def jsonable_dict_with_nulls_removed(d):
+    """
+    Get a copy of the given dictionary with empty-or-:obj:`None` items
+    removed recursively (just like :func:`dict_with_nulls_removed`
+    does) and with :class:`datetime.datetime` instances converted to
+    strings -- in the format used in JSON output (i.e., *ISO-8601*
+    with the ``"Z"`` suffix), so that the result can be serialized
+    without any Python-level :func:`json.dumps`'s `default` callbacks.
+
+    (A helper function used by :func:`data_dict_to_json`.)
+
+    >>> import datetime
+    >>> d = {
+    ...  'a': 'A', 'b': '', 'c': [], 'd': (), 'e': {}, 'f': [''], 'g': ['x'],
+    ...  'i': ['A', '', 0, [], (), {}, [None], [0.0], ['x']],
+    ...  'dt': datetime.datetime(2015, 6, 19, 10, 22, 42, 123),
+    ...  'dt_seq': [
+    ...    datetime.datetime(2015, 6, 19, 10, 22, 42),
+    ...    [],
+    ...    {'dt': datetime.datetime(2015, 6, 19, 10, 22, 42, 987654)},
+    ...  ],
+    ...  'z': 0,
+    ... }
+    >>> jsonable_dict_with_nulls_removed(d) == {
+    ...  'a': 'A', 'g': ['x'],
+    ...  'i': ['A', 0, [0.0], ['x']],
+    ...  'dt': '2015-06-19T10:22:42.000123Z',
+    ...  'dt_seq': [
+    ...    '2015-06-19T10:22:42Z',
+    ...    {'dt': '2015-06-19T10:22:42.987654Z'},
+    ...  ],
+    ...  'z': 0,
+    ... }
+    True
+
+    >>> jsonable_dict_with_nulls_removed({})
+    {}
+    """
+    return dict_with_nulls_removed(d, _jsonable_scalar_or_none)
+
+
+def jsonable_value_with_nulls_removed(
+        v,
+        # [the following constants are placed here as pseudo-arguments
+        # just for efficiency (local variable lookups are faster than
+        # dict-based global/builtin lookups)]
+        _container_with_nulls_removed=_container_with_nulls_removed,
+        _jsonable_scalar_or_none=_jsonable_scalar_or_none,
+        _isinstance=isinstance,
+        _jsonable_container=(dict, list, tuple)):
+    """
+    Convert the given value in the same way as
+    :func:`jsonable_dict_with_nulls_removed` converts dictionary values
+    (returning :obj:`None` if the value is to be removed).
+
+    (Can be used as the `value_converter` argument for
+    :meth:`n6sdk.data_spec.BaseDataSpec.make_result_dict_cleaner` --
+    see: :attr:`BaseStreamRenderer.accepts_jsonable_data`.)
+
+    >>> import datetime
+    >>> jsonable_value_with_nulls_removed(
+    ...     datetime.datetime(2015, 6, 19, 10, 22, 42, 123))
+    '2015-06-19T10:22:42.000123Z'
+    >>> jsonable_value_with_nulls_removed(['A', '', 0, [], [None], {'x': ''}])
+    ['A', 0]
+    >>> jsonable_value_with_nulls_removed([''])
+    >>> jsonable_value_with_nulls_removed('')
+    >>> jsonable_value_with_nulls_removed(0)
+    0
+    """
+    if _isinstance(v, _jsonable_container):
+        return _container_with_nulls_removed(v, _jsonable_scalar_or_none)
+    return _jsonable_scalar_or_none(v)
+
+
+def _make_nulls_skipping_json_encoder(
+        indent=None,
+        # [the following constants are placed here as pseudo-arguments
+        # just for efficiency (local variable lookups are faster than
+        # dict-based global/builtin lookups)]
+        _isinstance=isinstance,
+        _basestring=basestring,
+        _dict=dict,
+        _list_or_tuple=(list, tuple),
+        _int_or_long=(int, long),
+        _float=float,
+        _str=str,
+        _float_repr=float.__repr__,
+        _inf=float('inf'),
+        _dict_items=dict.iteritems,
+        _jsonable_scalar_or_none=_jsonable_scalar_or_none,
+        _json_default=_json_default,
+        _encode_str=json.encoder.encode_basestring_ascii):
+    # -> a function that takes a dict and returns its JSON representation
+    #    -- the same as `json.dumps(jsonable_dict_with_nulls_removed(d),
+    #    default=_json_default, indent=indent)` would return (except
+    #    that the order of keys may differ) but produced in one pass,
+    #    without building any intermediate copies of the data (empty
+    #    values are just skipped when encoding; non-container values
+    #    are checked/converted by the same function that
+    #    jsonable_dict_with_nulls_removed() uses)
+
+    if indent is None:
+        def get_separators(level):
+            return '', ', ', ''
+    else:
+        def get_separators(level):
+            newline_indent = '\n' + ' ' * (indent * (level + 1))
+            return (newline_indent,
+                    ', ' + newline_indent,
+                    '\n' + ' ' * (indent * level))
+    separators_cache = {}
+
+    def encode_scalar(v):
+        # -> JSON or None (if the value is to be skipped)
+        v = _jsonable_scalar_or_none(v)
+        if v is None:
+            return None
+        if _isinstance(v, _basestring):
+            return _encode_str(v)
+        if v is True:
+            return 'true'
+        if v is False:
+            return 'false'
+        if _isinstance(v, _int_or_long):
+            return _str(v)
+        if _isinstance(v, _float):
+            if v != v:
+                return 'NaN'
+            if v == _inf:
+                return 'Infinity'
+            if v == -_inf:
+                return '-Infinity'
+            return _float_repr(v)
+        v = _json_default(v)
+        if _isinstance(v, _basestring):
+            return _encode_str(v)
+        return encode(v, 0)  # (not expected to happen in practice)
+
+    def encode_key(k):
+        if _isinstance(k, _basestring):
+            return _encode_str(k)
+        if _isinstance(k, _float):
+            return _encode_str(encode_scalar(k))
+        if k is True or k is False or k is None:
+            return {True: '"true"', False: '"false"', None: '"null"'}[k]
+        if _isinstance(k, _int_or_long):
+            return '"' + _str(k) + '"'
+        raise TypeError("key " + repr(k) + " is not a string")
+
+    def encode(obj, level):
+        # -> JSON or None (if the container is empty after skipping
+        #    empty values)
+        try:
+            opening, item_separator, closing = separators_cache[level]
+        except KeyError:
+            opening, item_separator, closing = separators_cache[level] = (
+                get_separators(level))
+        sublevel = level + 1
+        if _isinstance(obj, _dict):
+            parts = []
+            for k, v in _dict_items(obj):
+                if _isinstance(v, _dict) or _isinstance(v, _list_or_tuple):
+                    v = encode(v, sublevel)
+                else:
+                    v = encode_scalar(v)
+                if v is not None:
+                    parts.append(encode_key(k) + ': ' + v)
+            if not parts:
+                return None
+            return '{' + opening + item_separator.join(parts) + closing + '}'
+        else:
+            parts = []
+            for v in obj:
+                if _isinstance(v, _dict) or _isinstance(v, _list_or_tuple):
+                    v = encode(v, sublevel)
+                else:
+                    v = encode_scalar(v)
+                if v is not None:
+                    parts.append(v)
+            if not parts:
+                return None
+            return '[' + opening + item_separator.join(parts) + closing + ']'
+
+    def encode_dict(d):
+        return encode(d, 0) or '{}'
+
+    return encode_dict
+
+
+# (maps `indent` values to encoders made with the above factory)
+_nulls_skipping_json_encoders = {}
+
+
+
+#
+# Data-spec-aware JSON encoders
+
+def get_data_spec_json_encoder(data_spec, separators=(', ', ': ')):
+    r"""
+    Get a function that serializes result dictionaries -- cleaned with
+    the given data specification -- to (non-indented) JSON.
+
+    Args:
+        `data_spec`:
+            A data specification object (an instance of a
+            :class:`n6sdk.data_spec.BaseDataSpec` subclass).
+        `separators` (default: ``(', ', ': ')``):
+            An ``(item_separator, key_separator)`` tuple (as for
+            :func:`json.dumps`).
+
+    Returns:
+        A function that takes a result dictionary and returns its JSON
+        representation: the same as :func:`data_dict_to_json` would
+        return for it (with the respective `separators` and the
+        ``'stdlib'`` JSON backend; except that the order of keys may
+        differ), i.e., with empty items removed and
+        :class:`datetime.datetime` instances converted to strings.
+
+    The function is generated (and cached) per data specification:
+    for each result field the way of encoding its values is chosen
+    up front -- on the basis of the field's class (e.g., values of
+    :class:`~n6sdk.data_spec.fields.IntegerField`-based fields are
+    expected to be integers, values of
+    :class:`~n6sdk.data_spec.fields.DateTimeField`-based fields are
+    expected to be "naive" :class:`datetime.datetime` instances...),
+    so that only a cheap type check is needed for each value; a value
+    of an unexpected type (e.g., returned by a custom field's
+    :meth:`clean_result_value`) is encoded in the generic (slower)
+    way.  The function is intended to be used for dictionaries
+    produced by the data specification's
+    :meth:`~n6sdk.data_spec.BaseDataSpec.clean_result_dict`.
+
+    >>> from n6sdk.data_spec import DataSpec
+    >>> data_spec = DataSpec()
+    >>> encode = get_data_spec_json_encoder(data_spec)
+    >>> encode is get_data_spec_json_encoder(data_spec)
+    True
+    >>> d = data_spec.clean_result_dict({
+    ...     'id': 'a' * 32,
+    ...     'source': 'foo.bar',
+    ...     'restriction': 'public',
+    ...     'confidence': 'low',
+    ...     'category': 'bots',
+    ...     'time': '2016-03-15T10:11:12.123Z',
+    ...     'address': [{'ip': '1.2.3.4', 'cc': 'PL', 'asn': 42}],
+    ...     'name': u'za\u017c\xf3\u0142\u0107 "q"',
+    ...     'injects': [{'a': [], 'b': 0}],
+    ...     'count': 0,
+    ... })
+    >>> import json
+    >>> json.loads(encode(d)) == json.loads(data_dict_to_json(d))
+    True
+    >>> encode({u'id': u'x', u'url': u'', u'address': [{u'ip': u''}]})
+    '{"id": "x"}'
+    >>> encode({u'not_a_result_key': [1, {'a': None}, 2.5]})
+    '{"not_a_result_key": [1, 2.5]}'
+    >>> encode({})
+    '{}'
+    >>> get_data_spec_json_encoder(data_spec, (',', ':'))({
+    ...     'address': [{'ip': u'1.2.3.4', 'asn': 42}],
+    ...     'count': 3})
+    '{"count":3,"address":[{"ip":"1.2.3.4","asn":42}]}'
+    """
+    separators = tuple(separators)
+    encoders = _data_spec_json_encoders.get(data_spec)
+    if encoders is None:
+        encoders = _data_spec_json_encoders[data_spec] = {}
+    encode = encoders.get(separators)
+    if encode is None:
+        encode = encoders[separators] = _make_data_spec_json_encoder(
+            data_spec.result_field_specs(),
+            *separators)
+    return encode
+
+
+# (maps data specs to dicts that map separators to encoders)
+_data_spec_json_encoders = weakref.WeakKeyDictionary()
+
+_DEFAULT_JSON_SEPARATORS = (', ', ': ')
+
+
+def _make_data_spec_json_encoder(field_specs, item_separator, key_separator):
+    encode_dict = _make_json_dict_encoder(field_specs,
+                                          item_separator,
+                                          key_separator)
+
+    def encode(data):
+        return encode_dict(data) or '{}'
+
+    return encode
+
+
+def _make_json_dict_encoder(
+        key_to_field,
+        item_separator,
+        key_separator,
+        # [the following constants are placed here as pseudo-arguments
+        # just for efficiency (local variable lookups are faster than
+        # dict-based global/builtin lookups)]
+        _dict_items=dict.iteritems,
+        _encode_str=json.encoder.encode_basestring_ascii):
+    # -> a function that takes a dict and returns its JSON
+    #    representation (or None if it is empty after skipping
+    #    empty values)
+    key_to_prefix_and_encoder = {
+        key: (_encode_str(key) + key_separator,
+              _make_json_value_encoder(field,
+                                       item_separator,
+                                       key_separator))
+        for key, field in key_to_field.iteritems()}
+    get_prefix_and_encoder = key_to_prefix_and_encoder.get
+    encode_other = functools.partial(_encode_other_json_value,
+                                     separators=(item_separator,
+                                                 key_separator))
+
+    def encode_dict(d):
+        parts = []
+        for k, v in _dict_items(d):
+            prefix_and_encoder = get_prefix_and_encoder(k)
+            if prefix_and_encoder is None:
+                prefix, encode = _encode_str(k) + key_separator, encode_other
+            else:
+                prefix, encode = prefix_and_encoder
+            v = encode(v)
+            if v is not None:
+                parts.append(prefix + v)
+        if parts:
+            return '{' + item_separator.join(parts) + '}'
+        return None
+
+    return encode_dict
+
+
+def _make_json_value_encoder(
+        field,
+        item_separator,
+        key_separator,
+        # [pseudo-arguments -- see above]
+        _isinstance=isinstance,
+        _list_types=(list, tuple)):
+    # -> a function that takes a value of the given field and returns
+    #    its JSON representation (or None if the value is empty)
+    #    [note: each of the type-specific encoders checks the type of
+    #    the given value and, if it is not the expected one (e.g., if
+    #    some custom field's cleaning method returns something
+    #    unusual), falls back to _encode_other_json_value()]
+    encode_other = functools.partial(_encode_other_json_value,
+                                     separators=(item_separator,
+                                                 key_separator))
+    if isinstance(field, ResultListFieldMixin):
+        encode_item = _make_json_single_value_encoder(field,
+                                                      item_separator,
+                                                      key_separator)
+
+        def encode_list(values):
+            if not _isinstance(values, _list_types):
+                return encode_other(values)
+            parts = [v for v in map(encode_item, values) if v is not None]
+            if parts:
+                return '[' + item_separator.join(parts) + ']'
+            return None
+
+        return encode_list
+    return _make_json_single_value_encoder(field,
+                                           item_separator,
+                                           key_separator)
+
+
+def _make_json_single_value_encoder(
+        field,
+        item_separator,
+        key_separator,
+        # [pseudo-arguments -- see above]
+        _isinstance=isinstance,
+        _basestring=basestring,
+        _int_types=(int, long),
+        _bool=bool,
+        _datetime=datetime.datetime,
+        _dict=dict,
+        _str=str,
+        _datetime_to_json_str=_datetime_to_json_str,
+        _encode_str=json.encoder.encode_basestring_ascii):
+    encode_other = functools.partial(_encode_other_json_value,
+                                     separators=(item_separator,
+                                                 key_separator))
+    if isinstance(field, UnicodeField):
+        def encode_unicode(v):
+            if _isinstance(v, _basestring):
+                return _encode_str(v) if v else None
+            return encode_other(v)
+        return encode_unicode
+    if isinstance(field, IntegerField):
+        def encode_integer(v):
+            if _isinstance(v, _int_types) and not _isinstance(v, _bool):
+                return _str(v)
+            return encode_other(v)
+        return encode_integer
+    if isinstance(field, DateTimeField):
+        def encode_datetime(v):
+            if _isinstance(v, _datetime):
+                return '"' + _datetime_to_json_str(v) + '"'
+            return encode_other(v)
+        return encode_datetime
+    if (isinstance(field, DictResultField) and
+          field.key_to_subfield is not None):
+        encode_dict = _make_json_dict_encoder(field.key_to_subfield,
+                                              item_separator,
+                                              key_separator)
+
+        def encode_dict_or_other(v):
+            if _isinstance(v, _dict):
+                return encode_dict(v)
+            return encode_other(v)
+        return encode_dict_or_other
+    return encode_other
+
+
+def _encode_other_json_value(
+        v,
+        separators,
+        # [pseudo-arguments -- see above]
+        _isinstance=isinstance,
+        _basestring=basestring,
+        _encode_str=json.encoder.encode_basestring_ascii):
+    if _isinstance(v, _basestring):
+        # (e.g., a datetime already converted to string -- see:
+        # BaseStreamRenderer.accepts_jsonable_data)
+        return _encode_str(v) if v else None
+    if _isinstance(v, (dict, list, tuple)):
+        v = jsonable_value_with_nulls_removed(v)
+        if v is None:
+            return None
+    elif not (v or v == 0):
+        return None
+    return json.dumps(v, separators=separators, default=_json_default)
+
+
+def _make_jsonable_dict_json_encoder(json_backend=None, separators=None):
+    # -> a function that encodes a dict already made jsonable (e.g.,
+    #    by jsonable_dict_with_nulls_removed()) to JSON
+    if separators is not None:
+        return functools.partial(json.dumps,
+                                 separators=separators,
+                                 default=_json_default)
+    encode = get_json_backend(json_backend)
+    if encode is _stdlib_json_encode:
+        return encode
+
+    def encode_with_fallback(d):
+        try:
+            return encode(d)
+        except Exception:
+            return _stdlib_json_encode(d)
+
+    return encode_with_fallback
+
+
+
+#
+# JSON backends (used to encode non-indented JSON)
+
+#: The name of the setting (in the *.ini file) that can specify the
+#: name of the JSON backend to be used by the standard renderers
+#: (if not specified, :data:`default_json_backend_name` is used).
+JSON_BACKEND_SETTING_NAME = 'n6sdk.json_backend'
+
+registered_json_backends = {}
+
+
+def register_json_backend(name, encode=None, allow_replace=False):
+    """
+    Register a JSON backend (encoding function) under the specified name.
+
+    Args:
+        `name` (:class:`str`):
+            The name of the backend.
+        `encode` (callable object):
+            A callable that takes one positional argument: a
+            JSON-serializable object (a dict whose empty items have
+            already been removed and whose :class:`datetime.datetime`
+            values have already been converted to strings -- see:
+            :func:`jsonable_dict_with_nulls_removed`) and returns its
+            (non-indented) JSON representation as a :class:`str`.
+            The JSON representation must be *semantically* the same
+            as the one produced by the :mod:`json` module (only
+            formatting details, such as white space, may differ).
+            Any exception raised by it will make the standard
+            :mod:`json`-based encoding be used as a fallback.
+        `allow_replace` (:class:`bool`; default: :obj:`False`):
+            If set to true you can replace a backend with another one.
+
+    Raises:
+        :exc:`~exceptions.RuntimeError`:
+            If `name` has been already used and `allow_replace` is not true.
+
+    Can also be used as a decorator (see:
+    :func:`n6sdk.pyramid_commons.register_stream_renderer`).
+
+    The following backends are registered automatically: ``'stdlib'``
+    (always), and ``'ujson'``, ``'simplejson'`` (each of them only if
+    the respective library is installed *and* its output has passed a
+    compatibility check; if it has not, a debug message is logged).
+    Note that *python-cjson* (even though installed as a dependency)
+    is not used as a backend because its output is not compatible
+    (it treats bytes of UTF-8-encoded :class:`str` strings as Latin-1
+    characters and rejects non-string dictionary keys).
+    """
+    if encode is None:
+        return functools.partial(
+            register_json_backend,
+            name, allow_replace=allow_replace)
+    if name in registered_json_backends and not allow_replace:
+        raise RuntimeError('JSON backend {0!r} already registered'
+                           .format(name))
+    registered_json_backends[name] = encode
+    return encode
+
+
+def get_json_backend(name=None):
+    """
+    Get the encoding function of the JSON backend registered under
+    the specified name (or :data:`default_json_backend_name` if the
+    name is :obj:`None`).
+
+    Raises:
+        :exc:`~exceptions.ValueError` if there is no such backend.
+
+    >>> get_json_backend('stdlib')({u'a': [1, u'b']})
+    '{"a": [1, "b"]}'
+    >>> (get_json_backend() is
+    ...  registered_json_backends[default_json_backend_name])
+    True
+    >>> get_json_backend('no such backend')
+    ... # doctest: +IGNORE_EXCEPTION_DETAIL
+    Traceback (most recent call last):
+      ...
+    ValueError: ...
+    """
+    if name is None:
+        name = default_json_backend_name
+    try:
+        return registered_json_backends[name]
+    except KeyError:
+        raise ValueError('JSON backend {0!r} is not registered (registered '
+                         'ones are: {1})'.format(
+                             name,
+                             ', '.join(map(repr, sorted(
+                                 registered_json_backends)))))
+
+
+def get_json_backend_name_from_settings(request):
+    """
+    Get the JSON backend name from the settings (see:
+    :data:`JSON_BACKEND_SETTING_NAME`) or :obj:`None` if not specified.
+
+    Raises:
+        :exc:`~exceptions.ValueError` if the specified backend is not
+        registered.
+    """
+    name = _get_settings(request).get(JSON_BACKEND_SETTING_NAME) or None
+    if name is not None:
+        get_json_backend(name)  # (just to check that it exists)
+    return name
+
+
+@register_json_backend('stdlib')
+def _stdlib_json_encode(obj):
+    return json.dumps(obj, default=_json_default)
+
+
+# (the order of preference: the fastest backends first)
+_JSON_BACKEND_CANDIDATES = []
+
+try:
+    import ujson
+except ImportError:
+    pass
+else:
+    _JSON_BACKEND_CANDIDATES.append(('ujson', functools.partial(
+        ujson.dumps,
+        ensure_ascii=True,
+        escape_forward_slashes=False)))
+
+try:
+    import simplejson
+except ImportError:
+    pass
+else:
+    _JSON_BACKEND_CANDIDATES.append(('simplejson', functools.partial(
+        simplejson.dumps,
+        default=_json_default,
+        use_decimal=False)))
+
+
+# (a sample object to check whether a backend's output is compatible
+# with the one produced by the `json` module -- a backend is not used
+# if it, e.g., loses float precision, handles non-ASCII `str` data or
+# non-string keys differently...)
+_JSON_BACKEND_PROBE = {
+    u'unicode': u'za\u017c\xf3\u0142\u0107 "/\\\n\t\x00',
+    'str': 'za\xc5\xbc\xc3\xb3\xc5\x82\xc4\x87',
+    u'numbers': [0, -1, 2 ** 70, 1 / 3.0, 1e300, -0.5],
+    u'bools': [True, False],
+    u'nested': {u'list': [u'x', {u'tuple': (1, u'y')}]},
+    123: u'int key',
+}
+
+
+def _is_json_backend_compatible(encode):
+    try:
+        return (json.loads(encode(_JSON_BACKEND_PROBE)) ==
+                json.loads(_stdlib_json_encode(_JSON_BACKEND_PROBE)))
+    except Exception:
+        return False
+
+
+def _register_compatible_json_backends(candidates):
+    for name, encode in candidates:
+        if _is_json_backend_compatible(encode):
+            register_json_backend(name, encode)
+        else:
+            LOGGER.debug(
+                'JSON backend %r not registered: its output is not '
+                'compatible with the output of the standard json module',
+                name)
+
+
+_register_compatible_json_backends(_JSON_BACKEND_CANDIDATES)
+
+#: The name of the JSON backend used if no other is specified: the
+#: fastest of the registered automatically ones.
+default_json_backend_name = next(
+    _name for _name, _ in _JSON_BACKEND_CANDIDATES + [('stdlib', None)]
+    if _name in registered_json_backends)
+
+
+def data_dict_to_json(data, json_backend=None, **kwargs):
     r"""
     Serialize the given data dictionary to JSON (using any additional
-    keyword arguments as argument for `func:`json.dumps`), applying
-    :func:`dict_with_nulls_removed` and converting contained
-    :class:`datetime.datetime` instances (if any) to strings.  Only
+    keyword arguments as argument for `func:`json.dumps`), removing
+    empty items (as :func:`dict_with_nulls_removed` does) and
+    converting contained :class:`datetime.datetime` instances (if any)
+    to strings.  Only
     :class:`datetime.datetime` instances that are "naive", i.e. not
     aware of timezone, can be used (effects of using timezone-aware
     ones are undefined).
@@ -254,8 +1542,49 @@ def data_dict_to_json(data, **kwargs):
     True
     >>> dcopy == d  # the given dictionary has not been modified
     True
+
+    >>> data_dict_to_json({'a': ['', {'b': None}]})
+    '{}'
+    >>> data_dict_to_json({'a': [1, {'b': 2.5, 'c': ''}]}, indent=2)
+    '{\n  "a": [\n    1, \n    {\n      "b": 2.5\n    }\n  ]\n}'
+    >>> data_dict_to_json({'a': [1, {'b': 2.5, 'c': ''}]},
+    ...                   separators=(',', ':'))
+    '{"a":[1,{"b":2.5}]}'
+
+    If no keyword arguments other than `json_backend` are given (or
+    `indent` is given as :obj:`None`), the JSON backend whose name is
+    `json_backend` is used (or the :data:`default_json_backend_name`
+    one if `json_backend` is not specified) -- see:
+    :func:`register_json_backend`.
+
+    >>> data_dict_to_json({'a': [1, {'b': 2.5, 'c': ''}]},
+    ...                   json_backend='stdlib')
+    '{"a": [1, {"b": 2.5}]}'
+
+    If no keyword arguments other than `indent` are given, a one-pass
+    encoder is used: empty items are skipped when writing the output,
+    without making a cleaned copy of the data.  (Such an encoder is
+    used only if it is expected to be faster than :func:`json.dumps`
+    applied to a cleaned copy; that is not the case when no `indent`
+    is given and the C-accelerated :mod:`json` encoder is available.)
     """
+    if kwargs.viewkeys() <= {'indent'}:
+        indent = kwargs.get('indent')
+        if indent is None:
+            encode = get_json_backend(json_backend)
+            if encode is not _stdlib_json_encode:
+                jsonable = jsonable_dict_with_nulls_removed(data)
+                try:
+                    return encode(jsonable)
+                except Exception:
+                    return _stdlib_json_encode(jsonable)
+        if indent is not None or json.encoder.c_make_encoder is None:
+            encoder = _nulls_skipping_json_encoders.get(indent)
+            if encoder is None:
+                encoder = _nulls_skipping_json_encoders[indent] = (
+                    _make_nulls_skipping_json_encoder(indent))
+            return encoder(data)
     return json.dumps(
-        dict_with_nulls_removed(data),
-        default=_json_default,
+        jsonable_dict_with_nulls_removed(data),
+        default=_json_default,  # (e.g., for datetime.datetime subclasses)
         **kwargs)
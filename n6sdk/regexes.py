@@ -78,11 +78,11 @@ IPv4_STRICT_DECIMAL_REGEX = re.compile(r'''
             )
         |                 # or
             (?=           # termination
-                $
+                \Z
             )
         )
     ){4}
-    $
+    \Z                    # (not `$` -- to reject a trailing newline)
 ''', re.VERBOSE)
 
 
@@ -6,10 +6,16 @@
 import collections
 import copy
 import datetime
+import types
 import unittest
 
-from mock import ANY
+from mock import (
+    ANY,
+    patch,
+    sentinel as sen,
+)
 
+from n6sdk.cache_helpers import LRUCache
 from n6sdk.class_helpers import (
     attr_required,
 )
@@ -1006,6 +1012,218 @@ class TestDataSpec_clean_result_dict(ResultCleanMixin, unittest.TestCase):
                             for info in exc.error_info_seq))
 
 
+class TestDataSpec_make_result_dict_cleaner(TestDataSpec_clean_result_dict):
+    """Like TestDataSpec_clean_result_dict but for a cleaner callable."""
+
+    def setUp(self):
+        super(TestDataSpec_make_result_dict_cleaner, self).setUp()
+        # (the inherited test methods will call the compiled cleaner)
+        make_result_dict_cleaner = self.ds.make_result_dict_cleaner
+        self.ds.clean_result_dict = (
+            lambda result, **kwargs: make_result_dict_cleaner(**kwargs)(result))
+
+    def test_valid_discarding_some_keys(self):
+        given_dict = self._given_dict()
+        cleaner = self.ds.make_result_dict_cleaner(
+            discarded_keys=['address', u'url'])
+        cleaned = cleaner(given_dict)
+        expected_cleaned = self._cleaned_dict(address=self.DEL, url=self.DEL)
+        self.assertEqualIncludingTypes(cleaned, expected_cleaned)
+
+    def test_forbidden_and_extra_required_keys(self):
+        given_dict = self._given_dict(address=self.DEL)
+        cleaner = self.ds.make_result_dict_cleaner(
+            forbidden_keys=['url'],
+            extra_required_keys=[u'address'])
+        with self.assertRaises(self.key_cleaning_error) as cm:
+            cleaner(given_dict)
+        exc = cm.exception
+        self.assertEqual(exc.illegal_keys, {'url'})
+        self.assertEqual(exc.missing_keys, {u'address'})
+
+    def test_cleaner_is_reusable(self):
+        cleaner = self.ds.make_result_dict_cleaner()
+        expected_cleaned = self._cleaned_dict()
+        for _ in range(3):
+            cleaned = cleaner(self._given_dict())
+            self.assertEqualIncludingTypes(cleaned, expected_cleaned)
+
+    def test_overridden_clean_result_dict_is_respected(self):
+        class DataSpecWithCustomCleaning(self.get_data_spec_class()):
+            def clean_result_dict(self, result, **kwargs):
+                cleaned = super(DataSpecWithCustomCleaning,
+                                self).clean_result_dict(result, **kwargs)
+                cleaned[u'custom'] = kwargs
+                return cleaned
+        ds = DataSpecWithCustomCleaning()
+        cleaner = ds.make_result_dict_cleaner(ignored_keys=['illegal'])
+        cleaned = cleaner(self._given_dict(illegal='spam'))
+        self.assertEqual(cleaned.pop(u'custom'), dict(
+            ignored_keys=['illegal'],
+        ))
+        self.assertEqualIncludingTypes(cleaned, self._cleaned_dict())
+
+    def test_overridden_clean_result_dict_with_extra_kwarg(self):
+        class DataSpecWithCustomCleaning(self.get_data_spec_class()):
+            def clean_result_dict(self, result, auth_token=None, **kwargs):
+                cleaned = super(DataSpecWithCustomCleaning,
+                                self).clean_result_dict(result, **kwargs)
+                cleaned[u'custom'] = auth_token
+                return cleaned
+        ds = DataSpecWithCustomCleaning()
+        cleaner = ds.make_result_dict_cleaner(auth_token=u'tok',
+                                              ignored_keys=['illegal'])
+        cleaned = cleaner(self._given_dict(illegal='spam'))
+        self.assertEqual(cleaned.pop(u'custom'), u'tok')
+        self.assertEqualIncludingTypes(cleaned, self._cleaned_dict())
+
+    def test_non_standard_kwarg_passed_to_clean_result_dict(self):
+        with patch.object(self.ds, 'clean_result_dict') as clean_result_dict:
+            cleaner = self.ds.make_result_dict_cleaner(auth_token=u'tok',
+                                                       discarded_keys=['x'])
+            cleaner(sen.result)
+        clean_result_dict.assert_called_once_with(sen.result,
+                                                  auth_token=u'tok',
+                                                  discarded_keys=['x'])
+
+    def test_value_converter(self):
+        given_dict = self._given_dict()
+        cleaned_url = self._cleaned_dict()[u'url']
+        cleaner = self.ds.make_result_dict_cleaner(
+            discarded_keys=['address'],
+            value_converter=(lambda v: None if v == cleaned_url else [v]))
+        cleaned = cleaner(given_dict)
+        expected_cleaned = {
+            k: [v] for k, v in self._cleaned_dict(address=self.DEL,
+                                                   url=self.DEL).items()}
+        self.assertEqualIncludingTypes(cleaned, expected_cleaned)
+
+    def test_value_converter_with_overridden_clean_result_dict(self):
+        class DataSpecWithCustomCleaning(self.get_data_spec_class()):
+            def clean_result_dict(self, result, **kwargs):
+                cleaned = super(DataSpecWithCustomCleaning,
+                                self).clean_result_dict(result, **kwargs)
+                cleaned[u'custom'] = None
+                return cleaned
+        ds = DataSpecWithCustomCleaning()
+        cleaner = ds.make_result_dict_cleaner(value_converter=(
+            lambda v: None if v is None else [v]))
+        cleaned = cleaner(self._given_dict())
+        expected_cleaned = {
+            k: [v] for k, v in self._cleaned_dict().items()}
+        self.assertEqualIncludingTypes(cleaned, expected_cleaned)
+
+    def test_key_cleaning_done_once_per_shape(self):
+        given_dicts = [
+            self._given_dict(),
+            self._given_dict(url=self.DEL),
+            self._given_dict(),
+            self._given_dict(url=self.DEL),
+            self._given_dict(),
+        ]
+        with patch.object(self.ds, '_clean_keys',
+                          wraps=self.ds._clean_keys) as _clean_keys_mock:
+            cleaner = self.ds.make_result_dict_cleaner()
+            cleaned_dicts = map(cleaner, given_dicts)
+        self.assertEqual(_clean_keys_mock.call_count, 2)
+        self.assertEqual(cleaned_dicts, [
+            self._cleaned_dict(),
+            self._cleaned_dict(url=self.DEL),
+            self._cleaned_dict(),
+            self._cleaned_dict(url=self.DEL),
+            self._cleaned_dict(),
+        ])
+
+    def test_key_cleaning_error_memoized_but_raised_each_time(self):
+        given_dict = self._given_dict(
+            **dict.fromkeys(self.example_illegal_keys))
+        cleaner = self.ds.make_result_dict_cleaner()
+        raised = []
+        for _ in range(2):
+            with self.assertRaises(self.key_cleaning_error) as cm:
+                cleaner(given_dict)
+            self.assertEqual(cm.exception.illegal_keys,
+                             self.example_illegal_keys)
+            self.assertEqual(cm.exception.missing_keys, set())
+            raised.append(cm.exception)
+        self.assertIsNot(raised[0], raised[1])
+
+    def test_shape_memo_is_bounded(self):
+        self.ds.result_dict_cleaner_max_shapes = 1
+        with patch.object(self.ds, '_clean_keys',
+                          wraps=self.ds._clean_keys) as _clean_keys_mock:
+            cleaner = self.ds.make_result_dict_cleaner()
+            for url in [self.DEL, 'http://x.example.org', self.DEL]:
+                cleaned = cleaner(self._given_dict(url=url))
+                self.assertEqualIncludingTypes(
+                    cleaned,
+                    self._cleaned_dict(url=(url if url is self.DEL
+                                            else url.decode('ascii'))))
+        self.assertEqual(_clean_keys_mock.call_count, 3)
+
+    def test_least_recently_used_shape_evicted(self):
+        self.ds.result_dict_cleaner_max_shapes = 2
+        with patch.object(self.ds, '_clean_keys',
+                          wraps=self.ds._clean_keys) as _clean_keys_mock:
+            cleaner = self.ds.make_result_dict_cleaner()
+            cleaner(self._given_dict())
+            cleaner(self._given_dict(url=self.DEL))
+            cleaner(self._given_dict())
+            cleaner(self._given_dict(address=self.DEL))  # (evicts no-url)
+            cleaner(self._given_dict())
+            self.assertEqual(_clean_keys_mock.call_count, 3)
+            cleaner(self._given_dict(url=self.DEL))
+        self.assertEqual(_clean_keys_mock.call_count, 4)
+
+
+class TestDataSpec_clean_result_dicts(ResultCleanMixin, unittest.TestCase):
+
+    def test_valid(self):
+        given_dicts = [
+            self._given_dict(),
+            self._given_dict(address=self.DEL, url=self.DEL),
+            self._given_dict(),
+        ]
+        cleaned_dicts = self.ds.clean_result_dicts(iter(given_dicts))
+        self.assertIsInstance(cleaned_dicts, types.GeneratorType)
+        self.assertEqualIncludingTypes(list(cleaned_dicts), [
+            self._cleaned_dict(),
+            self._cleaned_dict(address=self.DEL, url=self.DEL),
+            self._cleaned_dict(),
+        ])
+
+    def test_valid_with_kwargs(self):
+        given_dicts = [
+            self._given_dict(address='badvalue', illegal='spam'),
+            self._given_dict(illegal='spam'),
+        ]
+        cleaned_dicts = self.ds.clean_result_dicts(
+            given_dicts,
+            ignored_keys=['address', 'illegal'],
+            discarded_keys=['url'])
+        self.assertEqualIncludingTypes(list(cleaned_dicts), [
+            self._cleaned_dict(address=self.DEL, url=self.DEL),
+            self._cleaned_dict(address=self.DEL, url=self.DEL),
+        ])
+
+    def test_error_ends_iteration(self):
+        given_dicts = [
+            self._given_dict(),
+            self._given_dict(dport=65536),
+            self._given_dict(),
+        ]
+        cleaned_dicts = self.ds.clean_result_dicts(given_dicts)
+        self.assertEqualIncludingTypes(next(cleaned_dicts),
+                                       self._cleaned_dict())
+        with self.assertRaises(ResultValueCleaningError) as cm:
+            next(cleaned_dicts)
+        self.assertEqual(cm.exception.error_info_seq, [
+            (u'dport', 65536, ANY),
+        ])
+        with self.assertRaises(StopIteration):
+            next(cleaned_dicts)
+
+
 class TestDataSpec_clean_result_keys(ResultCleanMixin, unittest.TestCase):
 
     def test_valid(self):
@@ -1075,6 +1293,15 @@ class TestDataSpecSubclass_clean_result_dict(SubclassResultCleanMixin,
                             for info in exc.error_info_seq))
 
 
+class TestDataSpecSubclass_make_result_dict_cleaner(
+        SubclassResultCleanMixin,
+        TestDataSpec_make_result_dict_cleaner):
+    """Like TestDataSpec_make_result_dict_cleaner but for a DataSpec subclass."""
+
+    test_several_invalid_values = (
+        TestDataSpecSubclass_clean_result_dict.test_several_invalid_values.__func__)
+
+
 class TestDataSpecSubclass_clean_result_keys(SubclassResultCleanMixin,
                                              TestDataSpec_clean_result_keys):
     """Like TestDataSpec_clean_result_keys but for a DataSpec subclass."""
@@ -1119,3 +1346,86 @@ class TestDataSpecSubclass__field_custom_info(SubclassMixinBase,
             ),
             foo='bar',
         ))
+
+
+class TestDataSpec__key_cleaning_cache(ResultCleanMixin, unittest.TestCase):
+
+    def setUp(self):
+        super(TestDataSpec__key_cleaning_cache, self).setUp()
+        self._clean_keys_mock = patch.object(
+            self.ds, '_clean_keys',
+            wraps=self.ds._clean_keys).start()
+        self.addCleanup(patch.stopall)
+
+    def test_clean_result_dict(self):
+        for _ in range(3):
+            cleaned = self.ds.clean_result_dict(self._given_dict())
+            self.assertEqualIncludingTypes(cleaned, self._cleaned_dict())
+        self.assertEqual(self._clean_keys_mock.call_count, 1)
+
+    def test_clean_result_keys(self):
+        for _ in range(3):
+            cleaned_keys = self.ds.clean_result_keys(self._given_dict())
+            self.assertEqualIncludingTypes(cleaned_keys,
+                                           set(self._cleaned_dict()))
+        cleaned_keys.add(u'modified')  # (the result is a fresh set)
+        cleaned_keys = self.ds.clean_result_keys(self._given_dict())
+        self.assertEqualIncludingTypes(cleaned_keys,
+                                       set(self._cleaned_dict()))
+        self.assertEqual(self._clean_keys_mock.call_count, 1)
+
+    def test_different_shapes_and_kwargs_cached_separately(self):
+        self.ds.clean_result_dict(self._given_dict())
+        self.ds.clean_result_dict(self._given_dict(url=self.DEL))
+        self.ds.clean_result_dict(self._given_dict(), discarded_keys=('url',))
+        self.ds.clean_result_dict(self._given_dict(), ignored_keys=('url',))
+        self.assertEqual(self._clean_keys_mock.call_count, 4)
+        cleaned = self.ds.clean_result_dict(self._given_dict(),
+                                            discarded_keys=('url',))
+        self.assertEqualIncludingTypes(cleaned,
+                                       self._cleaned_dict(url=self.DEL))
+        self.assertEqual(self._clean_keys_mock.call_count, 4)
+
+    def test_unhashable_kwargs(self):
+        for _ in range(3):
+            cleaned = self.ds.clean_result_dict(self._given_dict(),
+                                                discarded_keys=['url'])
+            self.assertEqualIncludingTypes(cleaned,
+                                           self._cleaned_dict(url=self.DEL))
+        self.assertEqual(self._clean_keys_mock.call_count, 1)
+
+    def test_param_and_result_keys_cached_separately(self):
+        cleaned_keys = self.ds.clean_param_keys({'ip': ['1.2.3.4']},
+                                                ignored_keys=['ip'])
+        self.assertEqual(cleaned_keys, set())
+        with self.assertRaises(ResultKeyCleaningError) as cm:
+            self.ds.clean_result_keys({'ip': '1.2.3.4'},
+                                      ignored_keys=['ip'])
+        self.assertEqual(cm.exception.missing_keys, self.required_keys)
+        self.assertEqual(self._clean_keys_mock.call_count, 2)
+
+    def test_key_cleaning_error_raised_each_time(self):
+        given_dict = self._given_dict(
+            **dict.fromkeys(self.example_illegal_keys))
+        raised = []
+        for _ in range(3):
+            with self.assertRaises(self.key_cleaning_error) as cm:
+                self.ds.clean_result_dict(given_dict)
+            self.assertEqual(cm.exception.illegal_keys,
+                             self.example_illegal_keys)
+            self.assertEqual(cm.exception.missing_keys, set())
+            cm.exception.illegal_keys.clear()  # (must not affect the cache)
+            raised.append(cm.exception)
+        self.assertIsNot(raised[0], raised[1])
+        self.assertIsNot(raised[1], raised[2])
+        self.assertEqual(self._clean_keys_mock.call_count, 1)
+
+    def test_cache_is_bounded(self):
+        self.assertEqual(self.ds._key_cleaning_cache.maxsize,
+                         self.ds.key_cleaning_cache_max_size)
+        self.ds._key_cleaning_cache = LRUCache(maxsize=1)
+        self.ds.clean_result_dict(self._given_dict())
+        self.ds.clean_result_dict(self._given_dict(url=self.DEL))
+        self.ds.clean_result_dict(self._given_dict())
+        self.assertEqual(self._clean_keys_mock.call_count, 3)
+        self.assertEqual(len(self.ds._key_cleaning_cache), 1)
@@ -9,7 +9,14 @@ import datetime
 import decimal
 import unittest
 
-from mock import sentinel as sen
+from mock import (
+    patch,
+    sentinel as sen,
+)
+from n6sdk.addr_helpers import (
+    ip_str_to_int,
+    ipv6_str_to_int,
+)
 from n6sdk.exceptions import (
     FieldValueError,
     FieldValueTooLongError,
@@ -79,13 +86,15 @@ class FieldTestMixin(GenericDataSpecTestMixin):
             init_kwargs = dict(self.INIT_KWARGS_BASE or {}, **init_kwargs)
             deep_copy_of_given = copy.deepcopy(given)
             f = self.CLASS(**init_kwargs)
-            if isinstance(expected, type) and issubclass(
-                  expected, BaseException):
-                with self.assertRaises(expected):
-                    f.clean_result_value(given)
-            else:
-                cleaned_value = f.clean_result_value(given)
-                self.assertEqualIncludingTypes(cleaned_value, expected)
+            # (cleaning twice -- to check also memoized values, if any)
+            for _ in range(2):
+                if isinstance(expected, type) and issubclass(
+                      expected, BaseException):
+                    with self.assertRaises(expected):
+                        f.clean_result_value(given)
+                else:
+                    cleaned_value = f.clean_result_value(given)
+                    self.assertEqualIncludingTypes(cleaned_value, expected)
             # ensure that the given value has not been modified
             self.assertEqualIncludingTypes(deep_copy_of_given, given)
 
@@ -200,6 +209,98 @@ class TestInitKwargsAndAttributes(GenericDataSpecTestMixin, unittest.TestCase):
                 self.MyField(in_result=value)
 
 
+class TestCleanedValuesCache(unittest.TestCase):
+
+    class MyField(Field):
+        def clean_param_value(self, value):
+            value = super(TestCleanedValuesCache.MyField,
+                          self).clean_param_value(value)
+            self.calls.append(('param', value))
+            return unicode(value).lower()
+        def clean_result_value(self, value):
+            value = super(TestCleanedValuesCache.MyField,
+                          self).clean_result_value(value)
+            self.calls.append(('result', value))
+            if value == 'invalid':
+                raise FieldValueError(public_message=u'Invalid')
+            return unicode(value).upper()
+
+    def _make_field(self, **kwargs):
+        f = self.MyField(**kwargs)
+        f.calls = []
+        return f
+
+    def test_disabled_by_default(self):
+        f = self._make_field()
+        self.assertIsNone(f.cleaned_values_cache_max_size)
+        self.assertIsNone(f.cleaned_values_cache)
+        self.assertEqual(f.clean_result_value('foo'), u'FOO')
+        self.assertEqual(f.clean_result_value('foo'), u'FOO')
+        self.assertEqual(f.calls, [('result', 'foo'), ('result', 'foo')])
+
+    def test_enabled(self):
+        f = self._make_field(cleaned_values_cache_max_size=10)
+        for value in ['foo', 'bar', 'foo', 'bar', 'foo']:
+            cleaned_value = f.clean_result_value(value)
+            self.assertEqual(cleaned_value, value.upper())
+            self.assertIsInstance(cleaned_value, unicode)
+        self.assertEqual(f.calls, [('result', 'foo'), ('result', 'bar')])
+        self.assertEqual(f.cleaned_values_cache.hits, 3)
+        self.assertEqual(f.cleaned_values_cache.misses, 2)
+
+    def test_param_and_result_values_not_confused(self):
+        f = self._make_field(cleaned_values_cache_max_size=10)
+        for _ in range(2):
+            self.assertEqual(f.clean_param_value('Foo'), u'foo')
+            self.assertEqual(f.clean_result_value('Foo'), u'FOO')
+        self.assertEqual(f.calls, [('param', 'Foo'), ('result', 'Foo')])
+
+    def test_non_string_values_not_cached(self):
+        f = self._make_field(cleaned_values_cache_max_size=10)
+        for _ in range(2):
+            self.assertEqual(f.clean_result_value(1), u'1')
+            self.assertEqual(f.clean_result_value(['x']), u"['X']")
+        self.assertEqual(f.calls, [('result', 1), ('result', ['x'])] * 2)
+        self.assertEqual(len(f.cleaned_values_cache), 0)
+
+    def test_errors_not_cached(self):
+        f = self._make_field(cleaned_values_cache_max_size=10)
+        for _ in range(2):
+            with self.assertRaises(FieldValueError):
+                f.clean_result_value('invalid')
+        self.assertEqual(f.calls, [('result', 'invalid')] * 2)
+
+    def test_least_recently_used_values_evicted(self):
+        f = self._make_field(cleaned_values_cache_max_size=2)
+        for value in ['a', 'b', 'a', 'c', 'a', 'b', 'c']:
+            self.assertEqual(f.clean_result_value(value), value.upper())
+        self.assertEqual([value for _, value in f.calls],
+                         ['a', 'b', 'c', 'b', 'c'])
+
+    def test_enabled_by_default_for_some_field_classes(self):
+        for field in [UnicodeEnumField(enum_values=('a', 'b')),
+                      DirField(),
+                      CCField(),
+                      SourceField(),
+                      IPv6Field(),
+                      IPv6NetField()]:
+            self.assertTrue(field.cleaned_values_cache_max_size)
+            self.assertIsNotNone(field.cleaned_values_cache)
+            self.assertIn('clean_param_value', vars(field))
+            self.assertIn('clean_result_value', vars(field))
+        for field in [UnicodeField(),
+                      UnicodeLimitedField(max_length=3),
+                      DateTimeField(),
+                      IPv4Field()]:
+            self.assertIsNone(field.cleaned_values_cache_max_size)
+            self.assertIsNone(field.cleaned_values_cache)
+            self.assertNotIn('clean_result_value', vars(field))
+        field = UnicodeEnumField(enum_values=('a', 'b'),
+                                 cleaned_values_cache_max_size=None)
+        self.assertIsNone(field.cleaned_values_cache)
+        self.assertNotIn('clean_result_value', vars(field))
+
+
 #
 # Test of particular field types
 #
@@ -284,6 +385,30 @@ class TestDateTimeField(FieldTestMixin, unittest.TestCase):
             given=12345,
             expected=TypeError,
         )
+        yield case(
+            init_kwargs={'cleaned_values_cache_max_size': 2},
+            given='2014-04-01 01:07:42.123456+02:00',
+            expected=dt,
+        )
+
+    def test_cleaned_values_cache(self):
+        f = self.CLASS(cleaned_values_cache_max_size=2)
+        expected = datetime.datetime(2014, 3, 31, 23, 7, 42)
+        for _ in xrange(3):
+            self.assertEqual(f.clean_result_value('2014-04-01 01:07:42+02:00'),
+                             expected)
+            self.assertEqual(f.clean_param_value('2014-04-01 01:07:42+02:00'),
+                             expected)
+            with self.assertRaises(FieldValueError):
+                f.clean_result_value('2014-04-01 1:07:42')  # (not cached)
+            self.assertEqual(f.clean_result_value(expected), expected)
+        self.assertEqual(f.cleaned_values_cache.misses, 5)
+        self.assertEqual(f.cleaned_values_cache.hits, 4)
+        self.assertEqual(len(f.cleaned_values_cache), 2)
+
+    def test_cleaned_values_cache_disabled_by_default(self):
+        f = self.CLASS()
+        self.assertIsNone(f.cleaned_values_cache)
 
 
 class TestUnicodeField(FieldTestMixin, unittest.TestCase):
@@ -723,6 +848,29 @@ class TestUnicodeEnumField(FieldTestMixin, unittest.TestCase):
             expected=TypeError,
         )
 
+    def test_enum_values_attribute(self):
+        f = self.CLASS(enum_values=['ABC', u'123', 'en um', 'ABC'])
+        self.assertEqualIncludingTypes(
+            f.enum_values,
+            (u'ABC', u'123', u'en um', u'ABC'))
+
+    def test_many_enum_values(self):
+        enum_values = ['value{}'.format(i) for i in xrange(10000)]
+        f = self.CLASS(enum_values=enum_values)
+        self.assertEqualIncludingTypes(f.clean_result_value('value9999'),
+                                       u'value9999')
+        self.assertEqualIncludingTypes(f.clean_param_value(u'value0'),
+                                       u'value0')
+        with self.assertRaises(FieldValueError):
+            f.clean_result_value('value10000')
+
+    def test_error_message_preserves_order_of_enum_values(self):
+        f = self.CLASS(enum_values=['zz', 'aa', 'mm'])
+        with self.assertRaises(FieldValueError) as cm:
+            f.clean_param_value('xx')
+        self.assertEqual(cm.exception.public_message,
+                         u'"xx" is not one of: "zz", "aa", "mm"')
+
 
 # TODO: add __init__ method test
 class TestUnicodeLimitedField(FieldTestMixin, unittest.TestCase):
@@ -1065,6 +1213,14 @@ class TestIPv4Field(FieldTestMixin, unittest.TestCase):
             given='255.255.255.255 ',
             expected=FieldValueError
         )
+        yield case(
+            given='255.255.255.255\n',
+            expected=FieldValueError
+        )
+        yield case(
+            given=u'1.2.3.4\n',
+            expected=FieldValueError
+        )
         yield case(
             given=u'256.256.256.256',
             expected=FieldValueError
@@ -1129,6 +1285,32 @@ class TestIPv4Field(FieldTestMixin, unittest.TestCase):
             given=None,
             expected=TypeError,
         )
+        # (`param_value_as_int` does not affect result values)
+        yield case(
+            init_kwargs={'param_value_as_int': True},
+            given='123.45.67.8',
+            expected=u'123.45.67.8',
+        )
+
+    def test__clean_param_value__as_int(self):
+        f = self.CLASS(param_value_as_int=True)
+        for c in self.cases__clean_param_value():
+            if isinstance(c.expected, type):
+                with self.assertRaises(c.expected):
+                    f.clean_param_value(c.given)
+            else:
+                cleaned_value = f.clean_param_value(c.given)
+                self.assertEqualIncludingTypes(cleaned_value,
+                                               ip_str_to_int(c.expected))
+        self.assertEqualIncludingTypes(
+            f.clean_param_value(u'127.154.5.17'),
+            2140800273)
+        with self.assertRaises(FieldValueError):
+            f.clean_param_value(u'127.154.5.17\n')
+        with self.assertRaises(FieldValueError):
+            f.clean_param_value(u'127.154.5.١٧')
+        with self.assertRaises(FieldValueError):
+            f.clean_param_value(u'127.154.5.017')
 
 
 class TestIPv6Field(FieldTestMixin, unittest.TestCase):
@@ -1423,6 +1605,29 @@ class TestIPv6Field(FieldTestMixin, unittest.TestCase):
             expected=TypeError,
         )
 
+    def test_cleaned_values_cache(self):
+        f = self.CLASS()
+        with patch('n6sdk.data_spec.fields.ipv6_str_to_int',
+                   wraps=ipv6_str_to_int) as ipv6_str_to_int_mock:
+            for _ in xrange(3):
+                self.assertEqual(
+                    f.clean_param_value(u'2001:db8::1'),
+                    u'2001:0db8:0000:0000:0000:0000:0000:0001')
+                self.assertEqual(
+                    f.clean_result_value(u'2001:db8::1'),
+                    u'2001:db8::1')
+        self.assertEqual(ipv6_str_to_int_mock.call_count, 2)
+
+    def test_cleaned_values_cache_disabled(self):
+        f = self.CLASS(cleaned_values_cache_max_size=None)
+        with patch('n6sdk.data_spec.fields.ipv6_str_to_int',
+                   wraps=ipv6_str_to_int) as ipv6_str_to_int_mock:
+            for _ in xrange(3):
+                self.assertEqual(
+                    f.clean_result_value(u'2001:0db8::0001'),
+                    u'2001:db8::1')
+        self.assertEqual(ipv6_str_to_int_mock.call_count, 3)
+
 
 class TestAnonymizedIPv4Field(FieldTestMixin, unittest.TestCase):
 
@@ -2232,6 +2437,25 @@ class TestIPv6NetField(FieldTestMixin, unittest.TestCase):
             expected=FieldValueError,
         )
 
+    def test_cleaned_values_cache(self):
+        f = self.CLASS(cleaned_values_cache_max_size=1)
+        with patch('n6sdk.data_spec.fields.ipv6_str_to_int',
+                   wraps=ipv6_str_to_int) as ipv6_str_to_int_mock:
+            for _ in xrange(3):
+                self.assertEqual(
+                    f.clean_result_value(u'2001:db8::1/32'),
+                    u'2001:db8::1/32')
+            self.assertEqual(ipv6_str_to_int_mock.call_count, 1)
+            self.assertEqual(
+                f.clean_param_value(u'2001:db8::1/32'),
+                (u'2001:0db8:0000:0000:0000:0000:0000:0001', 32))
+            self.assertEqual(ipv6_str_to_int_mock.call_count, 2)
+            # (the maximum cache size is 1 so the former value is evicted)
+            self.assertEqual(
+                f.clean_result_value(u'2001:db8::1/32'),
+                u'2001:db8::1/32')
+            self.assertEqual(ipv6_str_to_int_mock.call_count, 3)
+
 
 class TestCCField(FieldTestMixin, unittest.TestCase):
 
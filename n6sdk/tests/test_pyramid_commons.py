@@ -3,7 +3,13 @@
 # Copyright (c) 2013-2014 NASK. All rights reserved.
 
 
+import csv
+import datetime
+import itertools
+import json
+import threading
 import unittest
+import zlib
 
 from mock import (
     ANY,
@@ -20,6 +26,14 @@ from pyramid.httpexceptions import (
     HTTPServerError,
 )
 
+from n6sdk.data_spec import (
+    BaseDataSpec,
+    DataSpec,
+)
+from n6sdk.data_spec.fields import (
+    AddressField,
+    UnicodeField,
+)
 from n6sdk.exceptions import (
     DataAPIError,
     AuthorizationError,
@@ -30,6 +44,14 @@ from n6sdk.exceptions import (
 from n6sdk.pyramid_commons import (
     DefaultStreamViewBase,
     ConfigHelper,
+    StreamResponse,
+    iter_prefetched,
+    renderers as standard_stream_renderers,
+)
+from n6sdk.pyramid_commons.renderers import (
+    StreamRenderer_arrow,
+    msgpack,
+    pyarrow,
 )
 
 
@@ -126,11 +148,14 @@ class TestDefaultStreamViewBase__call_api(unittest.TestCase):
 
     def setUp(self):
         self.data_spec = MagicMock()
-        self.data_spec.clean_result_dict.side_effect = self.cleaned_list = [
+        self.clean_result_dict = MagicMock()
+        self.clean_result_dict.side_effect = self.cleaned_list = [
             sen.cleaned_result_dict_1,
             sen.cleaned_result_dict_2,
             sen.cleaned_result_dict_3,
         ]
+        self.data_spec.make_result_dict_cleaner.return_value = (
+            self.clean_result_dict)
 
         SomeAdjustedExc = self.SomeAdjustedExc
         self.adjust_exc = MagicMock(
@@ -187,10 +212,12 @@ class TestDefaultStreamViewBase__call_api(unittest.TestCase):
                 self._do_call()
             self.assertEqual(self.adjust_exc.call_count, 0)
         self.cls.get_clean_result_dict_kwargs.assert_called_once_with()
+        self.data_spec.make_result_dict_cleaner.assert_called_once_with(
+            kwarg=sen.kwarg)
         self.cls.call_api_method.assert_called_once_with(sen.api_method)
-        self.assertEqual(self.data_spec.clean_result_dict.mock_calls, [
-            call(sen.result_dict_1, kwarg=sen.kwarg),
-            call(sen.result_dict_2, kwarg=sen.kwarg),
+        self.assertEqual(self.clean_result_dict.mock_calls, [
+            call(sen.result_dict_1),
+            call(sen.result_dict_2),
         ])
         self.assertEqual(self.results, [
             sen.cleaned_result_dict_1,
@@ -204,18 +231,117 @@ class TestDefaultStreamViewBase__call_api(unittest.TestCase):
         self._do_call()
         self.assertEqual(self.adjust_exc.call_count, 0)
         self.cls.get_clean_result_dict_kwargs.assert_called_once_with()
+        self.data_spec.make_result_dict_cleaner.assert_called_once_with(
+            kwarg=sen.kwarg)
         self.cls.call_api_method.assert_called_once_with(sen.api_method)
-        self.assertEqual(self.data_spec.clean_result_dict.mock_calls, [
-            call(sen.result_dict_1, kwarg=sen.kwarg),
-            call(sen.result_dict_2, kwarg=sen.kwarg),
-            call(sen.result_dict_3, kwarg=sen.kwarg),
+        self.assertEqual(self.clean_result_dict.mock_calls, [
+            call(sen.result_dict_1),
+            call(sen.result_dict_2),
+            call(sen.result_dict_3),
+        ])
+        self.assertEqual(self.results, [
+            sen.cleaned_result_dict_1,
+            sen.cleaned_result_dict_2,
+            sen.cleaned_result_dict_3,
+        ])
+
+    def test_fused_clean_and_render(self):
+        self.cls.fused_clean_and_render = True
+        renderer_factory = MagicMock(accepts_jsonable_data=True)
+        renderer_factory.prefers_jsonable_data.return_value = True
+        with patch('n6sdk.pyramid_commons.registered_stream_renderers',
+                   new={'some': renderer_factory}):
+            self._do_call()
+        renderer_factory.prefers_jsonable_data.assert_called_once_with(
+            self.request)
+        self.data_spec.make_result_dict_cleaner.assert_called_once_with(
+            kwarg=sen.kwarg,
+            value_converter=(standard_stream_renderers.
+                             jsonable_value_with_nulls_removed))
+        self.assertEqual(self.results, [
+            sen.cleaned_result_dict_1,
+            sen.cleaned_result_dict_2,
+            sen.cleaned_result_dict_3,
+        ])
+
+    def test_fused_clean_and_render_not_supported_by_renderer(self):
+        self.cls.fused_clean_and_render = True
+        renderer_factory = MagicMock(accepts_jsonable_data=False)
+        with patch('n6sdk.pyramid_commons.registered_stream_renderers',
+                   new={'some': renderer_factory}):
+            self._do_call()
+        self.data_spec.make_result_dict_cleaner.assert_called_once_with(
+            kwarg=sen.kwarg)
+
+    def test_fused_clean_and_render_not_preferred_by_renderer(self):
+        self.cls.fused_clean_and_render = True
+        renderer_factory = MagicMock(accepts_jsonable_data=True)
+        renderer_factory.prefers_jsonable_data.return_value = False
+        with patch('n6sdk.pyramid_commons.registered_stream_renderers',
+                   new={'some': renderer_factory}):
+            self._do_call()
+        renderer_factory.prefers_jsonable_data.assert_called_once_with(
+            self.request)
+        self.data_spec.make_result_dict_cleaner.assert_called_once_with(
+            kwarg=sen.kwarg)
+
+    def test_fused_clean_and_render_with_standard_renderers(self):
+        self.cls.fused_clean_and_render = True
+        self.request.registry.settings = {}
+        for renderer_factory in [
+                standard_stream_renderers.StreamRenderer_sjson,
+                standard_stream_renderers.StreamRenderer_json,
+                standard_stream_renderers.StreamRenderer_json_compact,
+                standard_stream_renderers.StreamRenderer_csv,
+                standard_stream_renderers.StreamRenderer_tsv]:
+            self.assertTrue(renderer_factory.accepts_jsonable_data)
+            with patch('n6sdk.pyramid_commons.registered_stream_renderers',
+                       new={'some': renderer_factory}):
+                # (with the 'stdlib' JSON backend it never pays off)
+                self.assertFalse(self.obj.is_clean_and_render_fused())
+
+    def test_full_success_with_prefetching(self):
+        self.cls.get_prefetch_queue_size = MagicMock(return_value=2)
+        self._do_call()
+        self.assertEqual(self.adjust_exc.call_count, 0)
+        self.cls.get_prefetch_queue_size.assert_called_once_with()
+        self.assertEqual(self.clean_result_dict.mock_calls, [
+            call(sen.result_dict_1),
+            call(sen.result_dict_2),
+            call(sen.result_dict_3),
+        ])
+        self.assertEqual(self.results, [
+            sen.cleaned_result_dict_1,
+            sen.cleaned_result_dict_2,
+            sen.cleaned_result_dict_3,
         ])
+
+    @patch('n6sdk.pyramid_commons.iter_prefetched')
+    def test_prefetching_disabled_if_queue_size_not_positive(
+            self, iter_prefetched_mock):
+        self.cls.get_prefetch_queue_size = MagicMock(return_value=-1)
+        self._do_call()
+        self.assertEqual(iter_prefetched_mock.call_count, 0)
         self.assertEqual(self.results, [
             sen.cleaned_result_dict_1,
             sen.cleaned_result_dict_2,
             sen.cleaned_result_dict_3,
         ])
 
+    def test_breaking_on_backend_Exception_with_prefetching(self):
+        def result_dicts():
+            yield sen.result_dict_1
+            raise ZeroDivisionError
+        self.cls.get_prefetch_queue_size = MagicMock(return_value=2)
+        self.cls.call_api_method.return_value = result_dicts()
+        with self.assertRaises(self.SomeAdjustedExc) as cm:
+            self._do_call()
+        self.assertIsInstance(cm.exception.given_exc, ZeroDivisionError)
+        self.assertEqual(self.adjust_exc.call_count, 1)
+        self.assertEqual(self.results, [
+            sen.cleaned_result_dict_1,
+        ])
+
     def test_breaking_on_Exception(self):
         self.cls.call_api_method.side_effect = Exception
         with self.assertRaises(self.SomeAdjustedExc) as cm:
@@ -223,8 +349,10 @@ class TestDefaultStreamViewBase__call_api(unittest.TestCase):
         self.assertIsInstance(cm.exception.given_exc, Exception)
         self.assertEqual(self.adjust_exc.call_count, 1)
         self.cls.get_clean_result_dict_kwargs.assert_called_once_with()
+        self.data_spec.make_result_dict_cleaner.assert_called_once_with(
+            kwarg=sen.kwarg)
         self.cls.call_api_method.assert_called_once_with(sen.api_method)
-        self.assertEqual(self.data_spec.clean_result_dict.call_count, 0)
+        self.assertEqual(self.clean_result_dict.call_count, 0)
         self.assertEqual(self.results, [])
         not_comsumed_result_dicts = list(self.call_iter)
         self.assertEqual(not_comsumed_result_dicts, [
@@ -246,11 +374,13 @@ class TestDefaultStreamViewBase__call_api(unittest.TestCase):
         ])
         self.assertEqual(self.adjust_exc.call_count, 0)
         self.cls.get_clean_result_dict_kwargs.assert_called_once_with()
+        self.data_spec.make_result_dict_cleaner.assert_called_once_with(
+            kwarg=sen.kwarg)
         self.cls.call_api_method.assert_called_once_with(sen.api_method)
-        self.assertEqual(self.data_spec.clean_result_dict.mock_calls, [
-            call(sen.result_dict_1, kwarg=sen.kwarg),
-            call(sen.result_dict_2, kwarg=sen.kwarg),
-            call(sen.result_dict_3, kwarg=sen.kwarg),
+        self.assertEqual(self.clean_result_dict.mock_calls, [
+            call(sen.result_dict_1),
+            call(sen.result_dict_2),
+            call(sen.result_dict_3),
         ])
         self.assertEqual(self.results, [
             sen.cleaned_result_dict_1,
@@ -272,10 +402,312 @@ class TestDefaultStreamViewBase__call_api(unittest.TestCase):
                                      expected_exc_adjust=False)
 
 
+class TestDefaultStreamViewBase__call_api__with_real_data_spec(
+        unittest.TestCase):
+
+    class MyDataSpec(DataSpec):
+        def clean_result_dict(self, result, auth_token=None, **kwargs):
+            cleaned = super(
+                TestDefaultStreamViewBase__call_api__with_real_data_spec.
+                MyDataSpec, self).clean_result_dict(result, **kwargs)
+            if auth_token is not None:
+                cleaned['name'] = auth_token
+            return cleaned
+
+    def setUp(self):
+        self.request = MagicMock()
+        self.request.registry.data_backend_api.my_api_method = (
+            sen.api_method)
+        with patch('n6sdk.pyramid_commons.registered_stream_renderers',
+                   new={'some': MagicMock()}):
+            self.cls = DefaultStreamViewBase.concrete_view_class(
+                resource_id='some_resource_id',
+                renderers=frozenset({'some'}),
+                data_spec=self.MyDataSpec(),
+                data_backend_api_method='my_api_method',
+                adjust_exc=(lambda exc: exc))
+        self.cls._get_renderer_name = (lambda self: 'some')
+        self.cls.call_api_method = MagicMock(return_value=iter([
+            {
+                'id': 'a' * 32,
+                'source': 'foo.bar',
+                'restriction': 'public',
+                'confidence': 'low',
+                'category': 'bots',
+                'time': '2016-03-15 10:11:12',
+                'url': 'http://example.com/',
+            },
+        ]))
+        self.cls.get_clean_result_dict_kwargs = (
+            lambda self: {'auth_token': u'token',
+                          'discarded_keys': ['url']})
+        self.obj = self.cls(sen.context, self.request)
+
+    def test_extra_clean_result_dict_kwarg(self):
+        results = list(self.obj.call_api())
+        self.assertEqual(results, [{
+            'id': u'a' * 32,
+            'source': u'foo.bar',
+            'restriction': u'public',
+            'confidence': u'low',
+            'category': u'bots',
+            'time': datetime.datetime(2016, 3, 15, 10, 11, 12),
+            'name': u'token',
+        }])
+
+
+class Test_get_prefetch_queue_size(unittest.TestCase):
+
+    def _get_prefetch_queue_size(self, settings):
+        obj = DefaultStreamViewBase.__new__(DefaultStreamViewBase)
+        obj.request = MagicMock()
+        obj.request.registry.settings = settings
+        return obj.get_prefetch_queue_size()
+
+    def test_not_specified(self):
+        self.assertIsNone(self._get_prefetch_queue_size({}))
+
+    def test_specified(self):
+        self.assertEqual(self._get_prefetch_queue_size(
+            {'n6sdk.stream_prefetch_queue_size': '100'}), 100)
+
+    def test_not_positive(self):
+        for value in ('0', '-1'):
+            self.assertIsNone(self._get_prefetch_queue_size(
+                {'n6sdk.stream_prefetch_queue_size': value}))
+
+
+class Test_iter_prefetched(unittest.TestCase):
+
+    def test_backend_iterator_closed_when_consumer_stops(self):
+        backend_closed = threading.Event()
+        def result_dicts():
+            try:
+                for i in itertools.count():
+                    yield i
+            finally:
+                backend_closed.set()
+        prefetched = iter_prefetched(result_dicts(), 3)
+        self.assertEqual([next(prefetched), next(prefetched)], [0, 1])
+        prefetched.close()
+        self.assertTrue(backend_closed.wait(5))
+
+    def test_queue_size_not_positive(self):
+        for queue_size in (0, -1):
+            with self.assertRaises(ValueError):
+                next(iter_prefetched(iter([sen.result_dict]), queue_size))
+
+    def test_backend_iterated_in_another_thread(self):
+        thread_names = []
+        def result_dicts():
+            thread_names.append(threading.current_thread().name)
+            yield sen.result_dict
+        self.assertEqual(list(iter_prefetched(result_dicts(), 1)),
+                         [sen.result_dict])
+        self.assertEqual(thread_names, ['n6sdk-prefetch'])
+
+
+class TestStreamResponse(unittest.TestCase):
+
+    def _make_response(self, settings=None, accept_encoding=None):
+        request = MagicMock()
+        request.registry.settings = settings if settings is not None else {}
+        request.environ = (
+            {'HTTP_ACCEPT_ENCODING': accept_encoding}
+            if accept_encoding is not None else {})
+        data_generator = iter([{'a': 'A' * 100}, {'b': 42}])
+        return StreamResponse(data_generator, 'sjson', request)
+
+    def _expected_body(self):
+        return '{"a": "' + 'A' * 100 + '"}\n{"b": 42}\n\n'
+
+    def test__compression_not_enabled(self):
+        response = self._make_response(accept_encoding='gzip, deflate')
+        self.assertIsNone(response.content_encoding)
+        self.assertIsNone(response.vary)
+        self.assertEqual(''.join(response.app_iter), self._expected_body())
+
+    def test__compression_enabled__gzip(self):
+        response = self._make_response(
+            settings={'n6sdk.stream_compression': 'gzip, deflate'},
+            accept_encoding='deflate, gzip')
+        self.assertEqual(response.content_encoding, 'gzip')
+        self.assertEqual(tuple(response.vary), ('Accept-Encoding',))
+        body = zlib.decompress(''.join(response.app_iter),
+                               16 + zlib.MAX_WBITS)
+        self.assertEqual(body, self._expected_body())
+
+    def test__compression_enabled__deflate(self):
+        response = self._make_response(
+            settings={'n6sdk.stream_compression': 'gzip deflate',
+                      'n6sdk.stream_compression_level': '9',
+                      'n6sdk.stream_compression_flush_interval': '0'},
+            accept_encoding='gzip;q=0.5, deflate')
+        self.assertEqual(response.content_encoding, 'deflate')
+        body = zlib.decompress(''.join(response.app_iter))
+        self.assertEqual(body, self._expected_body())
+
+    def test__compression_enabled__not_accepted(self):
+        response = self._make_response(
+            settings={'n6sdk.stream_compression': 'gzip'})
+        self.assertIsNone(response.content_encoding)
+        self.assertEqual(tuple(response.vary), ('Accept-Encoding',))
+        self.assertEqual(''.join(response.app_iter), self._expected_body())
+
+    def test__csv_renderer(self):
+        request = MagicMock()
+        request.registry.settings = {}
+        data_spec = MagicMock()
+        data_spec.result_field_specs.return_value = dict.fromkeys(
+            ['url', 'id', 'address', 'time', 'count'])
+        data_generator = iter([
+            {'id': u'a', 'address': [{'ip': u'1.2.3.4', 'cc': u'PL'},
+                                     {'ip': u'5.6.7.8', 'asn': 42}],
+             'url': u'http://x/?a=1,b=\u017c'},
+            {'time': datetime.datetime(2016, 3, 15, 10, 11, 12), 'count': 3},
+        ])
+        response = StreamResponse(data_generator, 'csv', request,
+                                  data_spec=data_spec)
+        self.assertEqual(response.content_type, 'text/csv')
+        self.assertEqual(''.join(response.app_iter), (
+            'time,id,ip,ipv6,asn,cc,dir,rdns,count,url\r\n'
+            ',a,1.2.3.4 5.6.7.8,- -,- 42,PL -,- -,- -,,'
+            '"http://x/?a=1,b=\xc5\xbc"\r\n'
+            '2016-03-15T10:11:12Z,,,,,,,,3,\r\n'))
+
+    def test__csv_renderer__address_columns_from_data_spec(self):
+        request = MagicMock()
+        request.registry.settings = {}
+        data_spec = DataSpec()
+        data_generator = iter([data_spec.clean_result_dict({
+            'id': 'a' * 32,
+            'source': 'foo.bar',
+            'restriction': 'public',
+            'confidence': 'low',
+            'category': 'bots',
+            'time': '2016-03-15 10:11:12',
+            'address': [
+                {'ipv6': '2001:db8::1', 'asn': 1, 'cc': 'PL'},
+                {'ip': '1.2.3.4', 'dir': 'src', 'rdns': 'x.example.com'},
+            ],
+        })])
+        response = StreamResponse(data_generator, 'csv', request,
+                                  data_spec=data_spec)
+        rows = list(csv.reader(''.join(response.app_iter).splitlines()))
+        self.assertEqual(len(rows), 2)
+        row = dict(zip(*rows))
+        ip_index = rows[0].index('ip')
+        self.assertEqual(rows[0][ip_index:ip_index+6], [
+            'ip', 'ipv6', 'asn', 'cc', 'dir', 'rdns'])
+        self.assertEqual(row['ip'], '- 1.2.3.4')
+        self.assertEqual(row['ipv6'], '2001:db8::1 -')
+        self.assertEqual(row['asn'], '1 -')
+        self.assertEqual(row['cc'], 'PL -')
+        self.assertEqual(row['dir'], '- src')
+        self.assertEqual(row['rdns'], '- x.example.com')
+
+    def test__csv_renderer__address_columns_of_AddressField(self):
+        class MyDataSpec(BaseDataSpec):
+            id = UnicodeField(in_result='required')
+            address = AddressField(in_result='optional')
+        request = MagicMock()
+        request.registry.settings = {}
+        data_generator = iter([{'id': u'a', 'address': [{'ip': u'1.2.3.4'}]}])
+        response = StreamResponse(data_generator, 'csv', request,
+                                  data_spec=MyDataSpec())
+        self.assertEqual(''.join(response.app_iter), (
+            'id,ip,asn,cc\r\n'
+            'a,1.2.3.4,-,-\r\n'))
+
+    def test__json_compact_renderer(self):
+        for data_spec in (None, DataSpec()):
+            request = MagicMock()
+            request.registry.settings = {}
+            data_generator = iter([
+                {'id': u'a', 'name': u'', 'count': 3,
+                 'address': [{'ip': u'1.2.3.4', 'cc': None}]},
+                {'id': u'b', 'url': None,
+                 'time': datetime.datetime(2016, 3, 15, 10, 11, 12)},
+            ])
+            response = StreamResponse(data_generator, 'json_compact',
+                                      request, data_spec=data_spec)
+            self.assertEqual(response.content_type, 'application/json')
+            body = ''.join(response.app_iter)
+            lines = body.split('\n')
+            self.assertEqual(lines[0], '[')
+            self.assertEqual(lines[-1], ']')
+            self.assertEqual(len(lines), 4)
+            for line in lines[1:-1]:
+                self.assertNotIn(', ', line)
+                self.assertNotIn(': ', line)
+            self.assertEqual(json.loads(body), [
+                {u'id': u'a', u'count': 3,
+                 u'address': [{u'ip': u'1.2.3.4'}]},
+                {u'id': u'b', u'time': u'2016-03-15T10:11:12Z'},
+            ])
+
+    @unittest.skipIf(pyarrow is None, 'pyarrow not installed')
+    @patch.object(StreamRenderer_arrow, 'batch_size', 2)
+    def test__arrow_renderer(self):
+        request = MagicMock()
+        request.registry.settings = {}
+        data_generator = iter([
+            {'id': u'a', 'category': u'bots', 'count': 3,
+             'address': [{'ip': u'1.2.3.4', 'asn': 42}]},
+            {'id': u'b',
+             'time': datetime.datetime(2016, 3, 15, 10, 11, 12, 123456)},
+            {'id': u'c', 'category': u'phish'},
+        ])
+        response = StreamResponse(data_generator, 'arrow', request,
+                                  data_spec=DataSpec())
+        self.assertEqual(response.content_type,
+                         'application/vnd.apache.arrow.stream')
+        reader = pyarrow.ipc.open_stream(''.join(response.app_iter))
+        batches = list(reader)
+        self.assertEqual([batch.num_rows for batch in batches], [2, 1])
+        table = pyarrow.Table.from_batches(batches)
+        schema = table.schema
+        self.assertEqual(schema.names[:5],
+                         ['time', 'id', 'source', 'category', 'name'])
+        self.assertEqual(schema.field('time').type,
+                         pyarrow.timestamp('us'))
+        self.assertEqual(schema.field('count').type, pyarrow.int64())
+        self.assertIsInstance(schema.field('category').type,
+                              pyarrow.DictionaryType)
+        self.assertEqual(table.column('id').to_pylist(), [u'a', u'b', u'c'])
+        self.assertEqual(table.column('category').to_pylist(),
+                         [u'bots', None, u'phish'])
+        self.assertEqual(table.column('count').to_pylist(), [3, None, None])
+        self.assertEqual(
+            [addr and [{k: v for k, v in a.items() if v is not None}
+                       for a in addr]
+             for addr in table.column('address').to_pylist()],
+            [[{'ip': u'1.2.3.4', 'asn': 42}], None, None])
+        self.assertEqual(
+            table.column('time').cast(pyarrow.int64()).to_pylist(),
+            [None, 1458036672123456, None])
+
+    @unittest.skipIf(msgpack is None, 'msgpack (>= 1.0) not installed')
+    def test__msgpack_renderer(self):
+        request = MagicMock()
+        request.registry.settings = {}
+        data_generator = iter([
+            {'a': u'A', 'b': '', 'c': [42, None]},
+            {'time': datetime.datetime(2016, 3, 15, 10, 11, 12, 123456)},
+        ])
+        response = StreamResponse(data_generator, 'msgpack', request)
+        self.assertEqual(response.content_type, 'application/x-msgpack')
+        unpacker = msgpack.Unpacker(raw=False, timestamp=3)
+        unpacker.feed(''.join(response.app_iter))
+        self.assertEqual(list(unpacker), [
+            {u'a': u'A', u'c': [42]},
+            {u'time': datetime.datetime(2016, 3, 15, 10, 11, 12, 123456)},
+        ])
+
+
 ## TODO:
 # class Test...
 # class Test...
-# class Test...
 
 
 class TestConfigHelper(unittest.TestCase):
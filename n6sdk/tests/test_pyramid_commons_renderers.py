@@ -0,0 +1,433 @@
+# -*- coding: utf-8 -*-
+
+# Copyright (c) 2016 NASK. All rights reserved.
+
+
+import datetime
+import json
+import unittest
+
+from mock import (
+    ANY,
+    MagicMock,
+    call,
+    patch,
+)
+
+from n6sdk.data_spec import (
+    BaseDataSpec,
+    DataSpec,
+)
+from n6sdk.data_spec.fields import (
+    AddressField,
+    DateTimeField,
+    IntegerField,
+    ResultListFieldMixin,
+    UnicodeField,
+)
+from n6sdk.pyramid_commons.renderers import (
+    BaseStreamRenderer,
+    StreamRenderer_sjson,
+    _json_default,
+    _register_compatible_json_backends,
+    _stdlib_json_encode,
+    data_dict_to_json,
+    dict_with_nulls_removed,
+    get_json_backend,
+    get_data_spec_json_encoder,
+    get_json_backend_name_from_settings,
+    iter_coalesced_chunks,
+    jsonable_dict_with_nulls_removed,
+    register_json_backend,
+    registered_json_backends,
+)
+
+
+class Test_iter_coalesced_chunks(unittest.TestCase):
+
+    class FakeTime(object):
+        def __init__(self):
+            self.now = 0.0
+        def __call__(self):
+            return self.now
+
+    def setUp(self):
+        self.fake_time = self.FakeTime()
+
+    def _pieces(self, pieces_and_delays):
+        # (yields pieces, advancing the fake clock before each of them)
+        for piece, delay in pieces_and_delays:
+            self.fake_time.now += delay
+            yield piece
+
+    def _coalesced(self, pieces, chunk_size, flush_interval=None):
+        return iter_coalesced_chunks(pieces, chunk_size, flush_interval,
+                                     _time=self.fake_time)
+
+    def test_no_coalescing(self):
+        for chunk_size in (None, 0):
+            self.assertEqual(
+                list(self._coalesced(['a', '', 'bc', 'd'], chunk_size)),
+                ['a', 'bc', 'd'])
+
+    def test_coalescing_by_size(self):
+        self.assertEqual(
+            list(self._coalesced(['ab', '', 'cd', 'efg', 'h', 'i'], 4)),
+            ['abcd', 'efgh', 'i'])
+
+    def test_coalescing_without_flush_interval_waits_for_size(self):
+        chunks = self._coalesced(
+            self._pieces([('a', 0), ('b', 100), ('c', 100)]), 4)
+        self.assertEqual(list(chunks), ['abc'])
+
+    def test_flush_interval(self):
+        chunks = self._coalesced(
+            self._pieces([
+                ('a', 0),
+                ('b', 0.5),
+                ('c', 0.6),   # 1.1s since the start -> flush
+                ('d', 0.2),
+                ('e', 0.2),
+                ('f', 0.7),   # 1.1s since the previous flush -> flush
+                ('g', 0.1),
+            ]),
+            chunk_size=100,
+            flush_interval=1)
+        self.assertEqual(next(chunks), 'abc')
+        self.assertEqual(self.fake_time.now, 1.1)
+        self.assertEqual(next(chunks), 'def')
+        self.assertEqual(self.fake_time.now, 2.2)
+        self.assertEqual(list(chunks), ['g'])
+
+    def test_flush_interval_zero_flushes_every_piece(self):
+        chunks = self._coalesced(
+            self._pieces([('a', 0), ('', 0), ('b', 0)]),
+            chunk_size=100,
+            flush_interval=0)
+        self.assertEqual(list(chunks), ['a', 'b'])
+
+    def test_size_limit_with_flush_interval(self):
+        chunks = self._coalesced(
+            self._pieces([('ab', 0), ('cd', 0), ('e', 0)]),
+            chunk_size=3,
+            flush_interval=10)
+        self.assertEqual(list(chunks), ['abcd', 'e'])
+
+
+class TestBaseStreamRenderer__chunking(unittest.TestCase):
+
+    class MyRenderer(BaseStreamRenderer):
+        content_type = 'text/plain'
+        def render_content(self, data, **kwargs):
+            return data
+
+    def _make_renderer(self, settings):
+        request = MagicMock()
+        request.registry.settings = settings
+        return self.MyRenderer(iter(['a', 'b', 'c']), request)
+
+    def test_no_coalescing_by_default(self):
+        renderer = self._make_renderer({})
+        self.assertIsNone(renderer.chunk_size)
+        self.assertIsNone(renderer.flush_interval)
+        self.assertEqual(list(renderer.generate_content()), ['a', 'b', 'c'])
+
+    def test_settings(self):
+        renderer = self._make_renderer({
+            'n6sdk.stream_chunk_size': '2',
+            'n6sdk.stream_flush_interval': '0.5',
+        })
+        self.assertEqual(renderer.chunk_size, 2)
+        self.assertEqual(renderer.flush_interval, 0.5)
+        self.assertEqual(list(renderer.generate_content()), ['ab', 'c'])
+
+
+class TestStreamRenderer_sjson__jsonable_data(unittest.TestCase):
+
+    def _make_request(self, settings):
+        request = MagicMock()
+        request.registry.settings = settings
+        return request
+
+    def test_prefers_jsonable_data(self):
+        with patch.dict(registered_json_backends,
+                        {'some': _stdlib_json_encode}):
+            self.assertFalse(StreamRenderer_sjson.prefers_jsonable_data(
+                self._make_request({'n6sdk.json_backend': 'stdlib'})))
+            self.assertTrue(StreamRenderer_sjson.prefers_jsonable_data(
+                self._make_request({'n6sdk.json_backend': 'some'})))
+
+    def test_data_spec_encoder_used_for_jsonable_data(self):
+        data_spec = DataSpec()
+        renderer = StreamRenderer_sjson(
+            iter([jsonable_dict_with_nulls_removed({
+                'id': u'a', 'name': u'', 'count': 3,
+                'time': datetime.datetime(2016, 3, 15, 10, 11, 12)})]),
+            self._make_request({'n6sdk.json_backend': 'stdlib'}))
+        renderer.data_spec = data_spec
+        renderer.data_is_jsonable = True
+        output = ''.join(renderer.generate_content())
+        self.assertIs(renderer.encode_json,
+                      get_data_spec_json_encoder(data_spec, (', ', ': ')))
+        self.assertEqual(json.loads(output), {
+            u'id': u'a', u'count': 3, u'time': u'2016-03-15T10:11:12Z'})
+
+
+class Test_data_dict_to_json__indented(unittest.TestCase):
+
+    data_dicts = [
+        {},
+        {u'a': u''},
+        {u'a': u'A', u'b': [], u'c': None, u'd': 0, u'e': False},
+        {
+            u'time': datetime.datetime(2016, 3, 15, 10, 11, 12),
+            u'modified': datetime.datetime(2016, 3, 15, 10, 11, 12, 123),
+            u'name': u'zaż\xf3łć "/\\\n\t\x00',
+            u'address': [
+                {u'ip': u'1.2.3.4', u'cc': u'PL', u'asn': 42},
+                {u'ip': u'1.2.3.5', u'cc': u'', u'asn': None},
+                {u'ip': u''},
+            ],
+            u'nested': {
+                u'list': [u'x', (1, u''), [None], {}, 2 ** 70],
+                u'dict': {u'x': {u'y': ()}},
+                u'floats': [0.1, -1.5e300, 1 / 3.0],
+                u'bools': [True, False],
+            },
+            u'count': 0,
+            u'url': u'',
+        },
+    ]
+
+    def _baseline(self, data, indent):
+        return json.dumps(dict_with_nulls_removed(data),
+                          indent=indent,
+                          default=_json_default)
+
+    def assertSameJSON(self, json_str, baseline_json_str):
+        # (the order of keys may differ, so -- apart from comparing the
+        # decoded data -- the formatting is compared line by line,
+        # ignoring item separators that depend on the order)
+        self.assertEqual(json.loads(json_str),
+                         json.loads(baseline_json_str))
+        self.assertEqual(self._sorted_lines(json_str),
+                         self._sorted_lines(baseline_json_str))
+
+    @staticmethod
+    def _sorted_lines(json_str):
+        return sorted(line.rstrip(', ') for line in json_str.split('\n'))
+
+    def test_same_as_baseline(self):
+        for data in self.data_dicts:
+            for indent in (1, 4):
+                self.assertSameJSON(data_dict_to_json(data, indent=indent),
+                                    self._baseline(data, indent))
+
+    def test_same_as_baseline_for_cleaned_result_dict(self):
+        from n6sdk.data_spec import DataSpec
+        data = DataSpec().clean_result_dict({
+            'id': 'a' * 32,
+            'source': 'foo.bar',
+            'restriction': 'public',
+            'confidence': 'low',
+            'category': 'bots',
+            'time': '2016-03-15T10:11:12.123Z',
+            'address': [{'ip': '1.2.3.4', 'cc': 'PL', 'asn': 42},
+                        {'ip': '1.2.3.5'}],
+            'url': '',
+            'count': 0,
+        })
+        self.assertSameJSON(data_dict_to_json(data, indent=4),
+                            self._baseline(data, 4))
+
+    def test_given_dict_not_modified(self):
+        data = {u'a': [u'', {u'b': None}], u'c': 1}
+        data_dict_to_json(data, indent=4)
+        self.assertEqual(data, {u'a': [u'', {u'b': None}], u'c': 1})
+
+
+class Test_get_data_spec_json_encoder(unittest.TestCase):
+
+    # custom fields whose result cleaning methods return values of
+    # types other than those returned by their base classes' ones
+
+    class TupleReturningUnicodeField(UnicodeField):
+        def clean_result_value(self, value):
+            return tuple(value.split())
+
+    class ListReturningUnicodeField(UnicodeField):
+        def clean_result_value(self, value):
+            return value.split()
+
+    class StrReturningDateTimeField(DateTimeField):
+        def clean_result_value(self, value):
+            return str(value)
+
+    class BoolReturningIntegerField(IntegerField):
+        def clean_result_value(self, value):
+            return bool(value)
+
+    class FloatReturningIntegerField(IntegerField):
+        def clean_result_value(self, value):
+            return float(value)
+
+    class ListReturningAddressField(AddressField):
+        def clean_result_value(self, value):
+            return [[addr['ip']] for addr in value]
+
+    class StrReturningUnicodeListField(ResultListFieldMixin, UnicodeField):
+        def clean_result_value(self, value):
+            return ' '.join(value)
+
+    def setUp(self):
+        cls = self.__class__
+
+        class MyDataSpec(BaseDataSpec):
+            tup = cls.TupleReturningUnicodeField(in_result='optional')
+            lst = cls.ListReturningUnicodeField(in_result='optional')
+            time = cls.StrReturningDateTimeField(in_result='optional')
+            flag = cls.BoolReturningIntegerField(in_result='optional')
+            ratio = cls.FloatReturningIntegerField(in_result='optional')
+            address = cls.ListReturningAddressField(in_result='optional')
+            words = cls.StrReturningUnicodeListField(in_result='optional')
+
+        self.data_spec = MyDataSpec()
+
+    def _test(self, result, expected_data):
+        cleaned = self.data_spec.clean_result_dict(result)
+        for separators in [(', ', ': '), (',', ':')]:
+            encode = get_data_spec_json_encoder(self.data_spec, separators)
+            encoded = encode(cleaned)
+            self.assertEqual(json.loads(encoded), expected_data)
+            self.assertEqual(json.loads(encoded), json.loads(
+                data_dict_to_json(cleaned, separators=separators)))
+
+    def test_values_of_unexpected_types(self):
+        self._test(
+            {
+                'tup': u'a b',
+                'lst': u'c',
+                'time': datetime.datetime(2016, 3, 15, 10, 11, 12),
+                'flag': 1,
+                'ratio': 3,
+                'address': [{'ip': u'1.2.3.4'}, {'ip': u'5.6.7.8'}],
+                'words': [u'd', u'e'],
+            },
+            {
+                u'tup': [u'a', u'b'],
+                u'lst': [u'c'],
+                u'time': u'2016-03-15 10:11:12',
+                u'flag': True,
+                u'ratio': 3.0,
+                u'address': [[u'1.2.3.4'], [u'5.6.7.8']],
+                u'words': u'd e',
+            })
+
+    def test_empty_values_of_unexpected_types_skipped(self):
+        self._test(
+            {
+                'tup': u' ',
+                'lst': u'',
+                'flag': 0,
+                'words': [u''],
+            },
+            {
+                u'flag': False,
+            })
+
+    def test_values_of_expected_types(self):
+        data_spec = DataSpec()
+        result = {
+            'id': u'a', 'source': u'x.y', 'category': u'bots',
+            'confidence': u'low', 'restriction': u'public',
+            'time': datetime.datetime(2016, 3, 15, 10, 11, 12),
+            'address': [{'ip': u'1.2.3.4', 'asn': 42}],
+            'count': 3, 'url': u'http://x/',
+        }
+        cleaned = data_spec.clean_result_dict(result)
+        encode = get_data_spec_json_encoder(data_spec, (', ', ': '))
+        self.assertEqual(json.loads(encode(cleaned)),
+                         json.loads(data_dict_to_json(cleaned)))
+
+
+class Test_json_backends(unittest.TestCase):
+
+    def setUp(self):
+        patcher = patch.dict(registered_json_backends)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_register_and_get(self):
+        encode = MagicMock()
+        self.assertIs(register_json_backend('my', encode), encode)
+        self.assertIs(get_json_backend('my'), encode)
+
+    def test_register_as_decorator(self):
+        @register_json_backend('my')
+        def encode(obj):
+            return '{}'
+        self.assertIs(get_json_backend('my'), encode)
+
+    def test_register_duplicate(self):
+        register_json_backend('my', MagicMock())
+        with self.assertRaises(RuntimeError):
+            register_json_backend('my', MagicMock())
+        with self.assertRaises(RuntimeError):
+            register_json_backend('stdlib', MagicMock())
+        another_encode = MagicMock()
+        register_json_backend('my', another_encode, allow_replace=True)
+        self.assertIs(get_json_backend('my'), another_encode)
+
+    def test_get_not_registered(self):
+        with self.assertRaises(ValueError):
+            get_json_backend('no such backend')
+
+    def test_get_name_from_settings(self):
+        request = MagicMock()
+        request.registry.settings = {}
+        self.assertIsNone(get_json_backend_name_from_settings(request))
+        request.registry.settings = {'n6sdk.json_backend': 'stdlib'}
+        self.assertEqual(get_json_backend_name_from_settings(request),
+                         'stdlib')
+        request.registry.settings = {'n6sdk.json_backend': 'no such'}
+        with self.assertRaises(ValueError):
+            get_json_backend_name_from_settings(request)
+
+    @patch('n6sdk.pyramid_commons.renderers.LOGGER')
+    def test_incompatible_backends_rejected_and_logged(self, LOGGER):
+        def lossy_encode(obj):
+            return json.dumps(obj, ensure_ascii=False).encode('latin-1',
+                                                              'replace')
+        def failing_encode(obj):
+            raise TypeError
+        def compatible_encode(obj):
+            return json.dumps(obj, separators=(',', ':'),
+                              default=_json_default)
+        _register_compatible_json_backends([
+            ('lossy', lossy_encode),
+            ('failing', failing_encode),
+            ('compatible', compatible_encode),
+        ])
+        self.assertNotIn('lossy', registered_json_backends)
+        self.assertNotIn('failing', registered_json_backends)
+        self.assertIs(registered_json_backends['compatible'],
+                      compatible_encode)
+        self.assertEqual(LOGGER.mock_calls, [
+            call.debug(ANY, 'lossy'),
+            call.debug(ANY, 'failing'),
+        ])
+
+    def test_fallback_to_stdlib_if_backend_fails(self):
+        data = {u'a': [1, u'', {u'b': datetime.datetime(2016, 3, 15)}]}
+        failing_encode = MagicMock(side_effect=OverflowError)
+        register_json_backend('failing', failing_encode)
+        self.assertEqual(data_dict_to_json(data, json_backend='failing'),
+                         '{"a": [1, {"b": "2016-03-15T00:00:00Z"}]}')
+        failing_encode.assert_called_once_with(
+            {u'a': [1, {u'b': '2016-03-15T00:00:00Z'}]})
+
+    def test_stdlib_backend(self):
+        self.assertIs(get_json_backend('stdlib'), _stdlib_json_encode)
+        self.assertEqual(
+            data_dict_to_json({u'a': [1, u'']}, json_backend='stdlib'),
+            '{"a": [1]}')